@@ -0,0 +1,92 @@
+from http.server import BaseHTTPRequestHandler
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__))) # Let the function import its sibling modules
+from http_helpers import send_json
+from ingredient_normalizer import aggregate_ingredients, normalize_ingredients
+from instrumentation import RequestTrace, get_logger
+
+log = get_logger('aggregate_ingredients')
+
+# --- Aggregation Settings ---
+
+MAX_RECIPES = 200
+MAX_LINES = 10000 # Across all recipes in one call
+
+def recipe_source(recipe, index):
+    """What a recipe is credited as: its URL, else its title, else its position in the request."""
+    for value in (recipe.get('url'), recipe.get('title')):
+        if isinstance(value, str) and value:
+            return value
+    return index
+
+def ingredient_lines(value):
+    """The string entries of an ingredients list; anything else yields None."""
+    if not isinstance(value, list):
+        return None
+    return [line for line in value if isinstance(line, str)]
+
+# --- Main Handler Class ---
+
+class handler(BaseHTTPRequestHandler):
+    """POST {"recipes": [{"url", "title", "ingredients"}]} merges them into one grocery list.
+
+    POST {"ingredients": [...]} only parses the lines into quantity, unit and name.
+    """
+
+    def do_POST(self):
+        content_length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(content_length)
+
+        try:
+            data = json.loads(body)
+            recipes = data.get('recipes')
+            lines = ingredient_lines(data.get('ingredients'))
+        except (json.JSONDecodeError, AttributeError):
+            log.warning('invalid_json')
+            send_json(self, 400, {'error': 'Invalid JSON'})
+            return
+
+        trace = RequestTrace(endpoint='aggregate_ingredients')
+        if lines is not None and recipes is None:
+            if len(lines) > MAX_LINES:
+                send_json(self, 400, {'error': f'At most {MAX_LINES} ingredient lines per call'})
+                return
+            parsed = trace.time('normalize', normalize_ingredients, lines)
+            trace.annotate(lines=len(lines))
+            trace.finish(200)
+            send_json(self, 200, {"ingredients": parsed}, self._timing_headers(trace))
+            return
+
+        if not isinstance(recipes, list):
+            send_json(self, 400, {'error': 'Expected a "recipes" list or an "ingredients" list'})
+            return
+        if len(recipes) > MAX_RECIPES:
+            send_json(self, 400, {'error': f'At most {MAX_RECIPES} recipes per call'})
+            return
+
+        sources = []
+        for index, recipe in enumerate(recipes):
+            recipe_lines = ingredient_lines(recipe.get('ingredients')) if isinstance(recipe, dict) else None
+            if recipe_lines:
+                sources.append((recipe_source(recipe, index), recipe_lines))
+        line_count = sum(len(recipe_lines) for _, recipe_lines in sources)
+        if line_count > MAX_LINES:
+            send_json(self, 400, {'error': f'At most {MAX_LINES} ingredient lines per call'})
+            return
+
+        items = trace.time('aggregate', aggregate_ingredients, sources)
+        trace.annotate(recipes=len(sources), lines=line_count, items=len(items))
+        trace.finish(200)
+        log.info('aggregate_done', recipes=len(sources), lines=line_count, items=len(items))
+        send_json(self, 200, {"items": items}, self._timing_headers(trace))
+
+    def _timing_headers(self, trace):
+        return {
+            'Server-Timing': trace.server_timing(),
+            'Timing-Allow-Origin': '*', # Lets the app read the timings cross-origin
+        }
+
+# This setup allows Vercel to run the handler class.
@@ -0,0 +1,250 @@
+"""Offline bulk extraction over saved recipe pages, for seeding the catalogue and re-testing adapters.
+
+Runs the same pipeline as /api/fetch_recipe_meta (recipe_extraction.extract_recipe_meta) over
+directories of saved .html/.htm pages and WARC files (.warc, .warc.gz), spreading the parsing
+across a process pool. Inputs are streamed: directories are walked lazily, and WARC records are
+read one at a time with at most a few pages per worker in flight. Each page becomes one JSONL line
+with its source, URL, title, image, ingredients, strategy label and per-stage timings, written
+as soon as it is done.
+
+A saved page's URL, which decides the site adapter and resolves relative image links, is taken
+from its <link rel="canonical"> or og:url, else --base-url; WARC pages use WARC-Target-URI. A page
+with none of these gets "url": null, and a relative image it can't resolve becomes null. With
+--resume, sources already in the output file are skipped, so an interrupted run continues where
+it stopped.
+
+Usage:
+    python api/bulk_extract.py saved_pages/ crawl.warc.gz --out recipes.jsonl
+    python api/bulk_extract.py saved_pages/ --out recipes.jsonl --resume --workers 8
+    python api/bulk_extract.py ica_pages/ --out ica.jsonl --base-url https://www.ica.se/
+"""
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__))) # Let the tool import its sibling modules
+from instrumentation import RequestTrace
+from recipe_extraction import (CHARSET_SNIFF_BYTES, HEAD_END_TEXT_RE, META_TAG_RE, TAG_ATTRIBUTE_RE, ParsedPage,
+                               decode_body, extract_recipe_meta, recipe_content_hash, sniff_charset)
+
+# --- Bulk Settings ---
+
+HTML_SUFFIXES = ('.html', '.htm', '.xhtml')
+WARC_SUFFIXES = ('.warc', '.warc.gz')
+TASKS_PER_WORKER = 4 # Pages handed to the pool ahead of time; bounds memory when reading WARCs
+PROGRESS_EVERY = 500 # Pages between progress lines on stderr
+
+LINK_TAG_RE = re.compile(r'<link\b[^>]*>', re.IGNORECASE)
+
+# --- Input Streaming ---
+
+def iter_html_files(path):
+    """Yields HTML file paths under a directory in a stable order, without listing it all first."""
+    for directory, subdirectories, names in os.walk(path):
+        subdirectories.sort()
+        for name in sorted(names):
+            if name.lower().endswith(HTML_SUFFIXES):
+                yield os.path.join(directory, name)
+
+def _read_headers(stream):
+    """Reads 'Name: value' lines up to a blank line. Returns (first_line, {lowercased name: value})."""
+    first_line = stream.readline()
+    while first_line in (b'\r\n', b'\n'):
+        first_line = stream.readline() # Records are separated by blank lines
+    headers = {}
+    for line in iter(stream.readline, b''):
+        if line in (b'\r\n', b'\n'):
+            break
+        name, _, value = line.decode('utf-8', 'replace').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return first_line.decode('utf-8', 'replace').strip(), headers
+
+def _dechunk(body):
+    """Undoes Transfer-Encoding: chunked, which some crawlers store verbatim."""
+    decoded, position = bytearray(), 0
+    while position < len(body):
+        line_end = body.find(b'\r\n', position)
+        if line_end == -1:
+            break
+        size = int(body[position:line_end].split(b';')[0] or b'0', 16)
+        if size == 0:
+            break
+        decoded += body[line_end + 2:line_end + 2 + size]
+        position = line_end + 2 + size + 2
+    return bytes(decoded)
+
+def parse_http_response(payload):
+    """Splits a WARC response payload into (status_code, content_type, body bytes)."""
+    header_end = payload.find(b'\r\n\r\n')
+    if header_end == -1:
+        return None, None, b''
+    head, body = payload[:header_end].decode('iso-8859-1').split('\r\n'), payload[header_end + 4:]
+    status_parts = head[0].split(' ', 2)
+    status_code = int(status_parts[1]) if len(status_parts) > 1 and status_parts[1].isdigit() else None
+    headers = {}
+    for line in head[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        body = _dechunk(body)
+    if headers.get('content-encoding', '').lower() in ('gzip', 'x-gzip', 'deflate'):
+        body = zlib.decompress(body, 47) # 47: detect gzip or zlib framing
+    return status_code, headers.get('content-type'), body
+
+def iter_warc_pages(path):
+    """Yields (source, url, body, content_type) for each HTML 200 response record in a WARC file."""
+    opener = gzip.open if path.endswith('.gz') else open # gzip.open reads a member per record transparently
+    with opener(path, 'rb') as stream:
+        while True:
+            version, headers = _read_headers(stream)
+            if not version:
+                return
+            payload = stream.read(int(headers.get('content-length', 0)))
+            if headers.get('warc-type') != 'response' or 'application/http' not in headers.get('content-type', ''):
+                continue
+            try:
+                status_code, content_type, body = parse_http_response(payload)
+            except (ValueError, zlib.error):
+                continue # Undecodable payload; not a page we can extract
+            if status_code == 200 and 'html' in (content_type or ''):
+                yield f"{path}#{headers.get('warc-record-id', '')}", headers.get('warc-target-uri'), body, content_type
+
+def iter_tasks(inputs):
+    """Yields work items for the pool in input order: ('file', source, path) or ('page', source, url, body, content_type)."""
+    for path in inputs:
+        if os.path.isdir(path):
+            for file_path in iter_html_files(path):
+                yield ('file', file_path, file_path)
+        elif path.lower().endswith(WARC_SUFFIXES):
+            for source, url, body, content_type in iter_warc_pages(path):
+                yield ('page', source, url, body, content_type)
+        else:
+            yield ('file', path, path)
+
+# --- Worker ---
+
+def page_url_from_head(html_content, fallback):
+    """The page's own URL from <link rel="canonical"> or og:url in its <head>, else fallback."""
+    head_end = HEAD_END_TEXT_RE.search(html_content)
+    head = html_content[:head_end.start()] if head_end else html_content[:64 * 1024]
+    for tag_re, name_attribute, names, value_attribute in (
+            (LINK_TAG_RE, 'rel', ('canonical',), 'href'),
+            (META_TAG_RE, 'property', ('og:url',), 'content')):
+        for tag in tag_re.finditer(head):
+            attributes = {name.lower(): double or single or bare
+                          for name, double, single, bare in TAG_ATTRIBUTE_RE.findall(tag.group(0))}
+            value = attributes.get(value_attribute, '')
+            if attributes.get(name_attribute, '').lower() in names and value.startswith(('http://', 'https://')):
+                return value
+    return fallback
+
+def extract_task(task, base_url=None):
+    """Runs the extraction pipeline on one page in a worker process. Returns the JSONL record."""
+    started = time.perf_counter()
+    kind, source = task[0], task[1]
+    try:
+        if kind == 'file':
+            with open(task[2], 'rb') as f:
+                body = f.read()
+            url, content_type = None, None
+        else:
+            url, body, content_type = task[2], task[3], task[4]
+        html_content = decode_body(body, sniff_charset(content_type, body[:CHARSET_SNIFF_BYTES]))
+        url = url or page_url_from_head(html_content, base_url)
+
+        trace = RequestTrace(url, endpoint='bulk_extract') # Timings only; never finished, so no log line or metrics
+        page = ParsedPage(html_content, url or '')
+        result = extract_recipe_meta(page, trace)
+        result["title"] = result["title"] or None # The title defaults to the page URL
+        if not (result["imageUrl"] or '').startswith(('http://', 'https://')):
+            result["imageUrl"] = None # Relative, with nothing to resolve it against
+        return {
+            "source": source, "url": url, **result,
+            "strategy": trace.fields.get('strategy'),
+            "contentHash": recipe_content_hash(result),
+            "bytes": len(body),
+            "timings": trace.as_dict(page),
+            "total_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+    except Exception as e:
+        return {"source": source, "error": f"{type(e).__name__}: {e}",
+                "total_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+# --- Output and Resume ---
+
+def completed_sources(out_path):
+    """Sources already in the output file. A line cut off by an interruption is removed."""
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, 'rb+') as f:
+        good_end = 0
+        for line in iter(f.readline, b''):
+            try:
+                done.add(json.loads(line)['source'])
+            except (ValueError, KeyError):
+                break # Everything from here on was written by the interrupted run's last write
+            good_end = f.tell()
+        f.truncate(good_end)
+    return done
+
+def run(inputs, out_path, workers, resume, base_url=None):
+    done = completed_sources(out_path) if resume else set()
+    counts = {'pages': 0, 'errors': 0, 'skipped': 0}
+    strategies = {}
+    started = time.perf_counter()
+
+    with open(out_path, 'a' if resume else 'w', encoding='utf-8') as out, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+
+        def collect(finished):
+            for future in finished:
+                record = future.result()
+                out.write(json.dumps(record, ensure_ascii=False) + '\n')
+                counts['pages'] += 1
+                if 'error' in record:
+                    counts['errors'] += 1
+                else:
+                    strategies[record['strategy']] = strategies.get(record['strategy'], 0) + 1
+                if counts['pages'] % PROGRESS_EVERY == 0:
+                    out.flush()
+                    elapsed = time.perf_counter() - started
+                    print(f"{counts['pages']} pages, {counts['errors']} errors, "
+                          f"{counts['pages'] / elapsed:.1f} pages/s", file=sys.stderr, flush=True)
+
+        for task in iter_tasks(inputs):
+            if task[1] in done:
+                counts['skipped'] += 1
+                continue
+            if len(pending) >= workers * TASKS_PER_WORKER:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+            pending.add(pool.submit(extract_task, task, base_url))
+        collect(wait(pending).done)
+
+    elapsed = time.perf_counter() - started
+    return {**counts, "strategies": strategies, "seconds": round(elapsed, 1)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('inputs', nargs='+', help='directories of saved pages, .html files or .warc(.gz) files')
+    parser.add_argument('--out', required=True, help='JSONL file to write, one record per page')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes (default: all cores)')
+    parser.add_argument('--resume', action='store_true', help='append to --out, skipping pages it already has')
+    parser.add_argument('--base-url', help='URL of saved pages that name none themselves, e.g. the site they came from')
+    args = parser.parse_args()
+    if os.path.exists(args.out) and not args.resume:
+        parser.error(f'{args.out} exists; pass --resume to continue it or choose another --out')
+
+    summary = run(args.inputs, args.out, args.workers, args.resume, args.base_url)
+    print(json.dumps(summary), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
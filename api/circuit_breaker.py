@@ -0,0 +1,100 @@
+"""Per-host circuit breakers, so a recipe site that keeps failing is not hammered by retries.
+
+A breaker starts closed. After FAILURE_THRESHOLD consecutive failures (timeouts, connection
+errors, 5xx) it opens and requests to that host fail fast for OPEN_SECONDS. Then it lets a
+single trial request through (half-open): success closes it again, failure reopens it.
+"""
+import os
+import threading
+import time
+import urllib.parse
+
+FAILURE_THRESHOLD = int(os.environ.get('RECIPE_BREAKER_FAILURES', 5))
+OPEN_SECONDS = float(os.environ.get('RECIPE_BREAKER_OPEN_SECONDS', 30))
+MAX_TRACKED_HOSTS = 1000 # Healthy breakers are forgotten beyond this
+
+class CircuitBreaker:
+    """Failure state of one host: 'closed', 'open' or 'half_open'."""
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, open_seconds=OPEN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self._lock = threading.Lock()
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._trial_running = False
+
+    def allow(self):
+        """True if a request may go to the host now; in half-open state only one trial at a time."""
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.open_seconds:
+                self.state = 'half_open'
+            if self.state == 'closed' or (self.state == 'half_open' and not self._trial_running):
+                self._trial_running = self.state == 'half_open'
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        """Counts a failure. Also ends a half-open trial, which would otherwise block the host."""
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """Ends a half-open trial without a verdict, when our own deadline ran out before the host could answer."""
+        with self._lock:
+            self._trial_running = False
+
+    def retry_after(self):
+        """Seconds until the next trial request is allowed (0 when not open)."""
+        with self._lock:
+            if self.state != 'open':
+                return 0
+            return max(0, round(self.opened_at + self.open_seconds - time.monotonic()))
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "rejected": self.rejected}
+
+class CircuitBreakerRegistry:
+    """One breaker per hostname, created on first use."""
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, open_seconds=OPEN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self._lock = threading.Lock()
+        self._breakers = {}
+
+    def for_url(self, url):
+        host = (urllib.parse.urlparse(url).hostname or '').lower()
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                if len(self._breakers) >= MAX_TRACKED_HOSTS:
+                    self._forget_healthy()
+                breaker = self._breakers[host] = CircuitBreaker(self.failure_threshold, self.open_seconds)
+            return breaker
+
+    def _forget_healthy(self):
+        for host, breaker in list(self._breakers.items()):
+            if breaker.state == 'closed' and not breaker.failures:
+                del self._breakers[host]
+
+    def stats(self):
+        """Breakers that are open, half-open or have recent failures, keyed by host."""
+        with self._lock:
+            breakers = list(self._breakers.items())
+        return {host: breaker.stats() for host, breaker in breakers
+                if breaker.state != 'closed' or breaker.failures}
@@ -0,0 +1,100 @@
+from http.server import BaseHTTPRequestHandler
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__))) # Let the function import its sibling modules
+from fetch_recipe_meta import build_recipe_meta
+from http_helpers import is_valid_url, send_json
+from http_pool import PER_URL_DEADLINE, host_slot, run_per_host, session
+from instrumentation import RequestTrace, get_logger
+
+log = get_logger('fetch_recipe_batch')
+
+# --- Batch Settings ---
+
+MAX_BATCH_URLS = 100
+# The whole response is buffered by Vercel and lost if the function hits its 10 s limit, so the
+# batch stops at this budget and answers 504 for the entries it didn't get to, for the caller to resend
+BATCH_BUDGET = float(os.environ.get('RECIPE_BATCH_BUDGET', 8))
+
+def budget_exceeded(url):
+    return 504, {"error": "Batch time budget ran out before this URL was fetched", "title": url,
+                 "imageUrl": None, "ingredients": []}
+
+def fetch_one(url, batch_deadline):
+    """Runs the single-recipe pipeline for one batch entry under its host slot and deadline."""
+    deadline = min(time.monotonic() + PER_URL_DEADLINE, batch_deadline)
+    trace = RequestTrace(url, endpoint='fetch_recipe_batch')
+    slot = host_slot(url)
+    if not trace.time('slot_wait', slot.acquire, timeout=max(0, deadline - time.monotonic())):
+        trace.finish(504)
+        if deadline == batch_deadline:
+            return budget_exceeded(url)
+        return 504, {"error": "Timed out waiting for a connection slot", "title": url, "imageUrl": None, "ingredients": []}
+    try:
+        return build_recipe_meta(url, session=session, deadline=deadline, trace=trace)
+    finally:
+        slot.release()
+
+# --- Main Handler Class ---
+
+class handler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        content_length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(content_length)
+
+        try:
+            urls = json.loads(body).get('urls')
+        except (json.JSONDecodeError, AttributeError):
+            log.warning('invalid_json')
+            send_json(self, 400, {'error': 'Invalid JSON'})
+            return
+
+        if not isinstance(urls, list) or not urls:
+            send_json(self, 400, {'error': 'Expected a non-empty "urls" list'})
+            return
+        if len(urls) > MAX_BATCH_URLS:
+            send_json(self, 400, {'error': f'At most {MAX_BATCH_URLS} URLs per batch'})
+            return
+
+        # Keep order of first appearance, drop duplicates and reject invalid entries up front
+        urls = list(dict.fromkeys(u.strip() for u in urls if isinstance(u, str)))
+        invalid = [u for u in urls if not is_valid_url(u)]
+        valid = [u for u in urls if is_valid_url(u)]
+        log.info('batch_start', urls=len(valid), invalid=len(invalid))
+
+        # --- Stream NDJSON results in completion order --- #
+        self.send_response(200)
+        self.send_header('Content-type', 'application/x-ndjson')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+
+        for url in invalid:
+            self._write_line({"url": url, "status": 400, "error": "Invalid or missing URL"})
+
+        batch_deadline = time.monotonic() + BATCH_BUDGET
+        unfinished = 0
+        for url, future in run_per_host(valid, lambda url: fetch_one(url, batch_deadline), batch_deadline):
+            if future is None:
+                unfinished += 1
+                status_code, result = budget_exceeded(url)
+            else:
+                try:
+                    status_code, result = future.result()
+                except Exception as e:
+                    log.error('batch_entry_failed', exc_info=True, url=url, error=str(e))
+                    status_code, result = 500, {"error": f"Unexpected error: {e}", "title": url, "imageUrl": None, "ingredients": []}
+            self._write_line({"url": url, "status": status_code, **result})
+        if unfinished:
+            log.warning('batch_budget_exceeded', unfinished=unfinished)
+
+    def _write_line(self, body_dict):
+        """Writes one NDJSON record and flushes it so the client can render it right away."""
+        self.wfile.write(json.dumps(body_dict).encode('utf-8') + b'\n')
+        self.wfile.flush()
+
+# This setup allows Vercel to run the handler class.
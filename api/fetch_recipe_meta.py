@@ -3,292 +3,306 @@ import json
 import requests
 import urllib.parse
 import time
-from bs4 import BeautifulSoup
-import extruct # For extracting embedded metadata
-import re # For cleaning ingredient text
+import re
+import hmac
 import os # Import os to potentially access environment variables later if needed
-
-# --- Helper Functions for Parsing ---
-
-# --- Log raw HTML content for debugging Coop ---
-# def log_raw_html(url, content):
-#     if 'coop.se' in url:
-#         print(f"--- DEBUG: Raw HTML start for {url} ---", flush=True)
-#         print(content[:1000]) # Print first 1000 characters
-#         print("--- DEBUG: End Raw HTML start ---", flush=True)
-
-# -----------------------------------------------
-
-def extract_json_ld(html_content, url):
-    """Extracts JSON-LD metadata, specifically looking for Recipe schema."""
-    # log_raw_html(url, html_content) # Removed logging call
-    print(f"Attempting JSON-LD extraction for {url}", flush=True)
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__))) # Let the function import its sibling modules
+from http_helpers import is_valid_url, send_json
+from http_pool import DeadlineWatchdog
+from instrumentation import RequestTrace, get_logger, metrics
+from circuit_breaker import CircuitBreakerRegistry
+from recipe_cache import cache_from_environment, negative_cache_from_environment, normalize_url
+from single_flight import SingleFlight
+from thumbnail import thumbnail_urls
+from site_adapters import adapter_stats
+from recipe_extraction import (CHARSET_SNIFF_BYTES, ParsedPage, decode_body, extract_recipe_meta,
+                               has_recipe_ingredients, recipe_content_hash, sniff_charset)
+
+log = get_logger('fetch_recipe_meta')
+
+# --- Streaming Fetch ---
+# Reads the body in chunks and stops as soon as the <head> metadata and a complete Recipe
+# JSON-LD block with ingredients have arrived; recipe pages often carry megabytes of comments
+# and ads after the recipe.
+
+FETCH_HEADERS = {'User-Agent': 'Mozilla/5.0'}
+FETCH_TIMEOUT = 10 # Seconds
+FETCH_CHUNK_SIZE = 16 * 1024
+MAX_BODY_BYTES = int(os.environ.get('RECIPE_FETCH_MAX_BYTES', 3 * 1024 * 1024))
+DEADLINE_SLACK = 0.25 # Seconds; a read timeout this close to the deadline counts as reaching it
+
+# Where the <head> metadata is complete; <body> also ends it, since </head> is optional in HTML
+HEAD_END_RE = re.compile(rb'</head\s*>|<body\b', re.IGNORECASE)
+HEAD_END_OVERLAP = 64 # Bytes rescanned from the previous chunk, in case the tag is split across chunks
+JSON_LD_SCRIPT_BYTES_RE = re.compile(
+    rb'<script\b[^>]*\btype\s*=\s*["\']?application/ld\+json["\']?[^>]*>(.*?)</script\s*>',
+    re.IGNORECASE | re.DOTALL)
+JSON_LD_MARKER = b'application/ld+json'
+
+class FetchResult:
+    """The decoded (possibly partial) body of a fetched page plus what the fetch saw."""
+
+    def __init__(self, html_content, status_code, headers, encoding, bytes_read, stop_reason):
+        self.html = html_content
+        self.status_code = status_code
+        self.headers = headers
+        self.encoding = encoding
+        self.bytes_read = bytes_read
+        self.stop_reason = stop_reason # 'complete', 'recipe_found', 'size_cap', 'deadline' or 'not_modified'
+
+def _has_complete_recipe(buffer, scan_from, encoding):
+    """Checks complete JSON-LD blocks after scan_from. Returns (found, next_scan_position)."""
+    next_scan = scan_from
+    for match in JSON_LD_SCRIPT_BYTES_RE.finditer(buffer, scan_from):
+        next_scan = match.end()
+        script_bytes = match.group(1)
+        if b'Recipe' in script_bytes and has_recipe_ingredients(decode_body(script_bytes, encoding)):
+            return True, next_scan
+    # Nothing pending: skip ahead so later chunks don't rescan the same bytes
+    pending_block = buffer.find(JSON_LD_MARKER, next_scan)
+    if pending_block == -1:
+        next_scan = max(next_scan, len(buffer) - 256) # Overlap in case a tag is split across chunks
+    else:
+        next_scan = max(next_scan, buffer.rfind(b'<', 0, pending_block))
+    return False, next_scan
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """Our own request budget ran out, so the host is not to blame."""
+
+def _remaining(deadline, timeout):
+    """Socket timeout for the next blocking call, bounded by an absolute time.monotonic() deadline."""
+    if deadline is None:
+        return timeout
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded('Deadline exceeded')
+    return min(timeout, remaining)
+
+def _budget_spent(deadline):
+    """True once the deadline is within DEADLINE_SLACK, i.e. a socket timeout was ours, not the host's."""
+    return deadline is not None and deadline - time.monotonic() <= DEADLINE_SLACK
+
+def fetch_html(url, max_bytes=MAX_BODY_BYTES, session=None, timeout=FETCH_TIMEOUT, deadline=None, extra_headers=None):
+    """Streams a page, stopping early once the recipe has been seen or max_bytes is reached.
+
+    deadline is an absolute time.monotonic() value covering the whole download, so a server
+    that trickles bytes cannot hold the caller past it. If it passes after some of the body
+    has arrived, the partial page is returned with stop_reason 'deadline'; before that, the
+    request raises Timeout. Conditional requests (extra_headers with If-None-Match or
+    If-Modified-Since) come back with status 304 and an empty body. A timeout caused by the
+    deadline rather than the host raises DeadlineExceeded.
+    """
+    http = session or requests
+    headers = {**FETCH_HEADERS, **extra_headers} if extra_headers else FETCH_HEADERS
     try:
-        # Use extruct to find all JSON-LD blocks
-        metadata = extruct.extract(html_content, base_url=url, syntaxes=['json-ld'], uniform=True)
-        
-        if not metadata or 'json-ld' not in metadata or not metadata['json-ld']:
-             print("No JSON-LD metadata found.", flush=True)
-             return None
-
-        # Find the first item that looks like a Recipe
-        for item in metadata['json-ld']:
-            if isinstance(item, dict):
-                 # Check for '@type' being 'Recipe' or a list containing 'Recipe'
-                 item_type = item.get('@type', '')
-                 is_recipe = False
-                 if isinstance(item_type, list):
-                     is_recipe = 'Recipe' in item_type or 'http://schema.org/Recipe' in item_type
-                 elif isinstance(item_type, str):
-                     is_recipe = item_type == 'Recipe' or item_type == 'http://schema.org/Recipe'
-                 
-                 if is_recipe:
-                    print(f"Found JSON-LD Recipe object for {url}", flush=True)
-                    return item # Return the whole recipe object
-        
-        print(f"No JSON-LD object with @type 'Recipe' found for {url}", flush=True)
-        return None
-    except Exception as e:
-        print(f"Error during JSON-LD extraction for {url}: {e}", flush=True)
-        return None
-
-def get_image_url(recipe_data, source_url):
-    """Extracts image URL from JSON-LD data (can be complex)."""
-    if not recipe_data or not isinstance(recipe_data, dict):
-        return None
-
-    image_info = recipe_data.get('image')
-    
-    if not image_info:
+        response = http.get(url, headers=headers, timeout=_remaining(deadline, timeout), stream=True)
+    except requests.exceptions.Timeout as e:
+        if isinstance(e, DeadlineExceeded) or not _budget_spent(deadline):
+            raise
+        raise DeadlineExceeded(f'Deadline exceeded: {e}') from e
+    try:
+        response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
+        if response.status_code == 304:
+            return FetchResult('', 304, response.headers, None, 0, 'not_modified')
+        content_type = response.headers.get('Content-Type')
+        buffer = bytearray()
+        encoding = None
+        charset_checked = False
+        head_seen = False
+        head_scan_from = 0
+        scan_from = 0
+        stop_reason = 'complete'
+
+        watchdog = DeadlineWatchdog(response, deadline) # Cuts off a trickling server mid-chunk
+        try:
+            with watchdog:
+                for chunk in response.iter_content(FETCH_CHUNK_SIZE):
+                    buffer.extend(chunk)
+                    if deadline is not None and time.monotonic() >= deadline:
+                        stop_reason = 'deadline' # Keep what arrived; the <head> may still give a title and image
+                        break
+                    if len(buffer) >= max_bytes:
+                        del buffer[max_bytes:]
+                        stop_reason = 'size_cap'
+                        break
+                    if not head_seen:
+                        # Only the new bytes, so a page without </head> isn't rescanned quadratically
+                        head_seen = HEAD_END_RE.search(buffer, head_scan_from) is not None
+                        head_scan_from = max(0, len(buffer) - HEAD_END_OVERLAP)
+                    if not charset_checked and (len(buffer) >= CHARSET_SNIFF_BYTES or head_seen):
+                        encoding = sniff_charset(content_type, bytes(buffer[:CHARSET_SNIFF_BYTES]))
+                        charset_checked = True
+                    if head_seen:
+                        found, scan_from = _has_complete_recipe(buffer, scan_from, encoding)
+                        if found:
+                            stop_reason = 'recipe_found'
+                            break
+        except requests.exceptions.RequestException as e:
+            if not (watchdog.fired or _budget_spent(deadline)):
+                raise
+            if not buffer:
+                raise DeadlineExceeded(f'Deadline exceeded: {e}') from e
+            stop_reason = 'deadline' # A read cut short by the deadline still leaves a usable partial page
+        if watchdog.fired and stop_reason == 'complete':
+            if not buffer:
+                raise DeadlineExceeded('Deadline exceeded')
+            stop_reason = 'deadline' # The body ended because the watchdog closed the socket
+
+        if not charset_checked:
+            encoding = sniff_charset(content_type, bytes(buffer[:CHARSET_SNIFF_BYTES]))
+        body = bytes(buffer)
+        return FetchResult(decode_body(body, encoding), response.status_code, response.headers,
+                           encoding, len(body), stop_reason)
+    finally:
+        response.close() # Drops the rest of the body when we stopped early
+
+# --- Fetch-and-Extract Pipeline ---
+
+recipe_cache = cache_from_environment() # Module-level so warm instances keep their entries
+recipe_flights = SingleFlight() # Concurrent requests for the same URL share one fetch and parse
+negative_cache = negative_cache_from_environment()
+host_breakers = CircuitBreakerRegistry()
+
+# One budget covers the fetch, JSON-LD and fallback parsing. Past it, the response carries
+# whatever title and image the <head> gave instead of waiting for the full extraction.
+REQUEST_BUDGET = float(os.environ.get('RECIPE_REQUEST_BUDGET', 8)) # Seconds, under Vercel's 10 s limit
+# Per-host metrics, adapter hits and breaker hostnames show which sites users import from, so
+# GET only returns them to "Authorization: Bearer <RECIPE_STATS_TOKEN>"; unset, nobody gets them
+STATS_TOKEN = os.environ.get('RECIPE_STATS_TOKEN', '')
+
+def build_recipe_meta(url, session=None, deadline=None, cache=None, trace=None):
+    """Returns (status_code, response_dict) for one recipe URL, served from the cache when possible.
+
+    deadline is an absolute time.monotonic() budget for the whole request, REQUEST_BUDGET
+    from now if None. The request is recorded in `trace` (a new RequestTrace if None), which
+    is finished here. A request for a URL that is already being built waits for that build
+    and shares its result, under the first request's session and deadline.
+    """
+    trace = trace or RequestTrace(url)
+    status_code = 500
+    try:
+        cache = recipe_cache if cache is None else cache
+        deadline = deadline if deadline is not None else time.monotonic() + REQUEST_BUDGET
+        wait_start = time.perf_counter()
+        (status_code, result), shared = recipe_flights.do(
+            normalize_url(url), _build_recipe_meta, url, session, deadline, cache, trace)
+        if shared:
+            trace.record('coalesced_wait', time.perf_counter() - wait_start)
+            trace.annotate(coalesced=True, cache='coalesced')
+        # A new dict per caller, since the leader's response is shared; thumbnails are signed per response, never cached
+        if "imageUrl" in result:
+            result = {**result, "thumbnails": thumbnail_urls(result["imageUrl"])}
+        else:
+            result = dict(result)
+        return status_code, result
+    finally:
+        trace.finish(status_code)
+
+def _build_recipe_meta(url, session, deadline, cache, trace):
+    state, entry = cache.lookup(url) if cache else ('miss', None)
+    if state == 'fresh':
+        cache.count('hits')
+        trace.annotate(cache='hit')
+        return 200, {**entry.value, "cache": "hit"}
+
+    remembered = negative_cache.lookup(url) if negative_cache else None
+    if remembered is not None:
+        status_code, result = remembered
+        trace.annotate(cache='negative')
+        return status_code, {**result, "cache": "negative"}
+
+    conditional_headers = {}
+    if state == 'stale':
+        if entry.etag:
+            conditional_headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            conditional_headers['If-Modified-Since'] = entry.last_modified
+
+    status_code, result, fetched = _fetch_and_extract(url, session, deadline, trace, conditional_headers)
+    if status_code == 304 and entry is not None:
+        cache.renew(url, entry)
+        cache.count('revalidated')
+        trace.annotate(cache='revalidated')
+        return 200, {**entry.value, "cache": "revalidated", "timings": result["timings"]}
+    if entry is not None and (status_code != 200 or result.get("partial")):
+        trace.annotate(cache='stale')
+        return 200, {**entry.value, "cache": "stale", "timings": result["timings"]} # Old data beats an error
+
+    trace.annotate(cache='miss')
+    if cache:
+        cache.count('changed' if state == 'stale' else 'misses')
+        if status_code == 200 and result["ingredients"]:
+            cached_value = {key: value for key, value in result.items() if key != "timings"}
+            cache.store(url, cached_value, fetched.headers.get('ETag'), fetched.headers.get('Last-Modified'))
+    # Remember pages that answered with an HTTP error or had no ingredients, but not our own timeouts
+    if negative_cache and (result.get("upstreamStatus") or (status_code == 200 and not result["ingredients"] and not result.get("partial"))):
+        negative_cache.store(url, status_code, {key: value for key, value in result.items() if key != "timings"})
+    return status_code, {**result, "cache": "miss"}
+
+def record_fetch_error(breaker, error):
+    """Counts a failed fetch against the host's breaker unless the site answered 4xx. Returns that status or None.
+
+    When our own deadline ran out the host is not blamed, and a half-open trial is left to the next caller.
+    """
+    if isinstance(error, DeadlineExceeded):
+        breaker.release()
         return None
-
-    # Handle various image structures used by schema.org
-    if isinstance(image_info, str):
-        return urllib.parse.urljoin(source_url, image_info) # Make relative URLs absolute
-    elif isinstance(image_info, dict):
-        # Common patterns: {'url': '...'}, {'@id': '...'}
-        img_url = image_info.get('url') or image_info.get('@id')
-        return urllib.parse.urljoin(source_url, img_url) if img_url else None
-    elif isinstance(image_info, list) and image_info:
-        # Take the first image if it's a list
-        first_image = image_info[0]
-        if isinstance(first_image, str):
-             return urllib.parse.urljoin(source_url, first_image)
-        elif isinstance(first_image, dict):
-             img_url = first_image.get('url') or first_image.get('@id')
-             return urllib.parse.urljoin(source_url, img_url) if img_url else None
-            
-    return None # No usable image found
-
-def get_ingredients_from_json_ld(recipe_data):
-    """Extracts ingredients from the 'recipeIngredient' field."""
-    if not recipe_data or not isinstance(recipe_data, dict):
-        return []
-        
-    ingredients = recipe_data.get('recipeIngredient', [])
-    if isinstance(ingredients, list) and all(isinstance(i, str) for i in ingredients):
-         print(f"Found {len(ingredients)} ingredients via JSON-LD recipeIngredient.", flush=True)
-         # Basic cleaning: remove extra whitespace
-         return [re.sub(r'\\s+', ' ', ing).strip() for ing in ingredients if ing.strip()]
+    upstream_status = error.response.status_code if error.response is not None else None
+    if upstream_status is not None and upstream_status < 500:
+        breaker.record_success() # The site is up, this page just isn't there
     else:
-        print(f"JSON-LD found, but 'recipeIngredient' field is missing or not a list of strings.", flush=True)
-        return []
-
-def clean_ingredient_text(text):
-    """Cleans up extracted ingredient text."""
-    # Remove leading/trailing whitespace, condense multiple spaces, remove potential unicode noise
-    cleaned = re.sub(r'\\s+', ' ', text).strip()
-    # Optional: remove common instructional prefixes if needed (e.g., "Optional:", "For the sauce:")
-    # cleaned = re.sub(r'^Optional:|^For the [^:]+:', '', cleaned, flags=re.IGNORECASE).strip()
-    return cleaned
-
-def scrape_ingredients_fallback(html_content, url):
-    """Fallback HTML scraping for specific sites and generic patterns."""
-    print(f"Attempting fallback HTML scraping for {url}", flush=True)
-    soup = BeautifulSoup(html_content, 'html.parser')
-    ingredients = []
-    scraped_successfully = False
-    
-    hostname = urllib.parse.urlparse(url).hostname
-
+        breaker.record_failure()
+    return upstream_status
+
+def _fetch_and_extract(url, session, deadline, trace, conditional_headers=None):
+    """Fetches one recipe page and extracts its metadata. Returns (status_code, response_dict, fetch_result)."""
+    breaker = host_breakers.for_url(url)
+    if not breaker.allow():
+        trace.annotate(error='circuit_open')
+        return 503, {"error": "Recipe site is failing, try again shortly", "retryAfter": breaker.retry_after(),
+                     "title": url, "imageUrl": None, "ingredients": [], "timings": {}}, None
+
+    # --- Fetch HTML Content --- #
     try:
-        # --- Specific Site Checks ---
-        if 'ica.se' in hostname:
-            # ICA: Often uses <div class=\"ingredients\"><ul><li>...</li></ul></div>
-            # Or sometimes <div class=\"recipe-ingredients-list\">...</div>
-            ingredient_section = soup.find('div', class_='ingredients') or soup.find('div', class_='recipe-ingredients-list')
-            if ingredient_section:
-                 items = ingredient_section.find_all('li')
-                 if not items: # Check within divs if no LIs
-                    items = ingredient_section.find_all('div', recursive=False) # Non-recursive to avoid nesting issues
-                 ingredients = [clean_ingredient_text(item.get_text()) for item in items if item.get_text(strip=True)]
-                 print(f"ICA Scraper: Found {len(ingredients)} potential ingredients.", flush=True)
-                 scraped_successfully = len(ingredients) > 0
-                 
-        elif 'koket.se' in hostname:
-             # Koket: Often uses <div class=\"recipe-ingredients\"> or similar classes, with spans/divs inside
-             # Look for specific data attributes or structured lists
-             ingredient_section = soup.find('div', attrs={'data-recipe-ingredient-list': True}) # More robust selector
-             if not ingredient_section:
-                ingredient_section = soup.find('ul', class_='ingredient-list') # Alternative
-             if not ingredient_section: # Last resort class check
-                 ingredient_section = soup.find('div', class_=lambda x: x and 'ingredient' in x.lower())
-
-             if ingredient_section:
-                # Find elements likely containing individual ingredients
-                items = ingredient_section.find_all(['li', 'div', 'p'], recursive=True) # Be broad initially
-                # Filter items - avoid headers, titles, etc.
-                potential_ingredients = []
-                for item in items:
-                     text = clean_ingredient_text(item.get_text())
-                     # Simple heuristic: ignore very short strings or section titles
-                     if text and len(text) > 3 and not item.find(['h1', 'h2', 'h3', 'h4']):
-                         potential_ingredients.append(text)
-                # Simple deduplication if necessary (due to broad search)
-                ingredients = list(dict.fromkeys(potential_ingredients))
-                print(f"Koket Scraper: Found {len(ingredients)} potential ingredients.", flush=True)
-                scraped_successfully = len(ingredients) > 0
-
-        elif 'arla.se' in hostname:
-            # Arla: Often uses <div class=\"recipe-section__ingredients\"> or similar
-            ingredient_section = soup.find('div', class_=lambda x: x and 'ingredients' in x and 'recipe' in x)
-            if ingredient_section:
-                # Often uses <p> tags directly under the section or within a list
-                items = ingredient_section.find_all(['li', 'p'])
-                ingredients = [clean_ingredient_text(item.get_text()) for item in items if item.get_text(strip=True)]
-                print(f"Arla Scraper: Found {len(ingredients)} potential ingredients.", flush=True)
-                scraped_successfully = len(ingredients) > 0
-
-        elif 'coop.se' in hostname:
-            # Coop: Uses <div class="IngredientList-content"> containing <ul class="List List--section"> with <li class="u-paddingHxsm u-textNormal u-colorBase"> items
-            ingredient_content = soup.find('div', class_='IngredientList-content')
-            if ingredient_content:
-                # Find all relevant li elements within the content div
-                items = ingredient_content.find_all('li', class_='u-paddingHxsm u-textNormal u-colorBase')
-                ingredients = [clean_ingredient_text(item.get_text()) for item in items if item.get_text(strip=True)]
-                print(f"Coop Scraper: Found {len(ingredients)} potential ingredients.", flush=True)
-                scraped_successfully = len(ingredients) > 0
-            else:
-                print("Coop Scraper: Could not find 'IngredientList-content' div.", flush=True)
-
-        # --- Generic Blog Fallback (if specific checks failed) ---
-        if not scraped_successfully:
-            print("Specific site scraping failed or N/A, trying generic fallback...", flush=True)
-            
-            # Strategy 0: Find common Recipe Card Containers first
-            recipe_card_container = None
-            common_card_classes = ['wprm-recipe-container', 'tasty-recipe', 'tasty-recipes', 'mv-recipe-card', 'recipe-card', 'jetpack-recipe']
-            for card_class in common_card_classes:
-                recipe_card_container = soup.find('div', class_=card_class)
-                if recipe_card_container:
-                    print(f"Generic Fallback: Found potential recipe card container: div.{card_class}", flush=True)
-                    break # Found a container
-            
-            if recipe_card_container:
-                 # Search *within* the container for ingredients, stopping at instructions
-                 print("Generic Fallback: Searching within recipe card container...", flush=True)
-                 ingredients_in_card = []
-                 stop_collecting = False
-                 instruction_keywords = re.compile(r'instruction|method|anvisning|gör så här|directions|preparation', re.IGNORECASE)
-                 
-                 # Iterate through relevant elements within the card IN ORDER
-                 for element in recipe_card_container.find_all(['ul', 'ol', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'div']):
-                     if stop_collecting:
-                         break
-                         
-                     # 1. Check if this element is an instruction heading
-                     if element.name in ['h2', 'h3', 'h4', 'h5', 'h6'] and instruction_keywords.search(element.get_text()):
-                         print(f"Generic Fallback: Found instruction heading '{element.get_text(strip=True)}'. Stopping ingredient collection.", flush=True)
-                         stop_collecting = True
-                         continue # Don't process this heading as ingredients
-                         
-                     # 2. Check if it's a relevant ingredient list
-                     is_relevant_list = False
-                     if element.name in ['ul', 'ol']:
-                         if element.get('class') and any('ingredient' in c.lower() for c in element.get('class')):
-                              is_relevant_list = True
-                         else:
-                              prev_heading = element.find_previous_sibling(['h4', 'h5', 'h6'])
-                              if prev_heading and not instruction_keywords.search(prev_heading.get_text()): # Ensure it's not instruction heading
-                                  is_relevant_list = True
-
-                     if is_relevant_list:
-                          print(f"Generic Fallback: Found relevant list in card: {element.get('class')}", flush=True)
-                          items = element.find_all('li')
-                          ingredients_in_card.extend([clean_ingredient_text(item.get_text()) for item in items if item.get_text(strip=True)])
-                          continue # Processed as a list
-                          
-                     # 3. Check if it's a relevant ingredient div/paragraph
-                     is_relevant_element = False
-                     if element.name in ['div', 'p']:
-                          element_class_text = " ".join(element.get('class', [])).lower()
-                          # Check for ingredient class AND ensure it doesn't contain lists itself
-                          if re.search(r'ingredient', element_class_text) and not element.find(['ul', 'ol']):
-                               # Avoid adding the text of the main recipe card container itself if it matched
-                               is_main_card_container = any(card_class in element.get('class', []) for card_class in common_card_classes if card_class in element.get('class', []))
-                               if not is_main_card_container:
-                                    is_relevant_element = True
-
-                     if is_relevant_element:
-                          text = clean_ingredient_text(element.get_text())
-                          # Add a heuristic check: avoid overly long text which might be the whole section
-                          if text and len(text) < 150: # Arbitrary limit, adjust if needed
-                               print(f"Generic Fallback: Found relevant element in card: {element.get('class')} - Text: {text[:50]}...", flush=True)
-                               ingredients_in_card.append(text)
-                          # Keep the check for nested items if the element itself is empty
-                          elif not text:
-                               nested_items = element.find_all(['li', 'p'])
-                               ingredients_in_card.extend([clean_ingredient_text(item.get_text()) for item in nested_items if item.get_text(strip=True)])
-
-                 # Use the accumulated ingredients if any were found in the card
-                 if ingredients_in_card:
-                      # Remove duplicates while preserving order (for Python 3.7+)
-                      ingredients = list(dict.fromkeys(ingredients_in_card))
-                      print(f"Generic Fallback (Recipe Card Combined Strategy): Found {len(ingredients)} total ingredients.", flush=True)
-                      scraped_successfully = True
-                     
-            # --- Strategies 1 & 2 (Heading or Div Class across whole page) ---
-            # --- Only run if recipe card strategy failed                   ---
-            if not scraped_successfully:
-                 print("Generic Fallback (Recipe Card Strategy) failed or N/A, trying broader page search...", flush=True)
-                 # Strategy 1: Find heading + next list (existing logic)
-                 found_heading_list = False
-                 for heading in soup.find_all(['h2', 'h3', 'h4'], string=re.compile(r'ingredient|ingredienser', re.IGNORECASE)):
-                     print(f"Generic Fallback: Found potential heading: {heading.get_text(strip=True)}", flush=True)
-                     next_list = heading.find_next_sibling(['ul', 'ol'])
-                     if next_list:
-                         print("Generic Fallback: Found list following heading.", flush=True)
-                         items = next_list.find_all('li')
-                         ingredients = [clean_ingredient_text(item.get_text()) for item in items if item.get_text(strip=True)]
-                         if ingredients:
-                             print(f"Generic Fallback (Heading Strategy): Found {len(ingredients)} potential ingredients.", flush=True)
-                             scraped_successfully = True
-                             found_heading_list = True
-                             break # Stop searching once a list is found this way
-                 
-                 # Strategy 2: Find div with class name (if strategy 1 failed) (existing logic)
-                 if not found_heading_list:
-                      print("Generic Fallback (Heading Strategy) failed, trying div class strategy...", flush=True)
-                      # Find divs with class names containing 'ingredient'
-                      ingredient_divs = soup.find_all('div', class_=re.compile(r'ingredient', re.IGNORECASE))
-                      if not ingredient_divs:
-                          ingredient_divs = soup.find_all('div', class_=re.compile(r'tasty-recipes-ingredients|wprm-recipe-ingredients', re.IGNORECASE))
-                          
-                      for div in ingredient_divs:
-                          items = div.find_all(['li', 'p'], recursive=False)
-                          if not items:
-                              items = div.find_all('li')
-                          ingredients = [clean_ingredient_text(item.get_text()) for item in items if item.get_text(strip=True)]
-                          if ingredients:
-                              print(f"Generic Fallback (Div Class Strategy): Found {len(ingredients)} potential ingredients in div: {div.get('class')}", flush=True)
-                              scraped_successfully = True
-                              break
-
-    except Exception as e:
-        print(f"Error during fallback scraping for {url}: {e}", flush=True)
-        # Don't crash, just return empty list if scraping fails
-
-    return [ing for ing in ingredients if ing] # Final filter for empty strings
+        fetched = trace.time('fetch', fetch_html, url, session=session, deadline=deadline,
+                             extra_headers=conditional_headers)
+        html_content = fetched.html
+        breaker.record_success()
+        trace.annotate(http_status=fetched.status_code, bytes_fetched=fetched.bytes_read,
+                       stop_reason=fetched.stop_reason, charset=fetched.encoding or 'undeclared')
+
+    except requests.exceptions.RequestException as e:
+        upstream_status = record_fetch_error(breaker, e)
+        log.warning('fetch_failed', url=url, error=str(e), upstream_status=upstream_status)
+        trace.annotate(error='fetch', http_status=upstream_status)
+        if isinstance(e, requests.exceptions.Timeout):
+            return 504, {"error": f"Recipe site did not answer in time: {e}", "title": url, "imageUrl": None,
+                         "ingredients": [], "timings": trace.as_dict()}, None
+        # Return raw HTML as None and error state if fetch fails
+        return 500, {"error": f"Failed to fetch URL: {e}", "upstreamStatus": upstream_status, "title": url,
+                     "imageUrl": None, "ingredients": [], "timings": trace.as_dict()}, None
+    except Exception as e: # Catch potential unexpected errors during fetch setup
+        breaker.record_failure()
+        log.error('fetch_setup_failed', exc_info=True, url=url, error=str(e))
+        trace.annotate(error='unexpected')
+        return 500, {"error": f"Unexpected error: {e}", "title": url, "imageUrl": None, "ingredients": [],
+                     "timings": trace.as_dict()}, None
+
+    if fetched.status_code == 304:
+        return 304, {"timings": trace.as_dict()}, fetched
+
+    page = ParsedPage(html_content, url) # Parsed once, lazily, and shared by every stage below
+    trace.attach(page)
+    result = extract_recipe_meta(page, trace, deadline)
+    result.update({
+        "etag": fetched.headers.get('ETag'),
+        "lastModified": fetched.headers.get('Last-Modified'),
+        "contentHash": recipe_content_hash(result),
+        "timings": trace.as_dict(page),
+    })
+    return 200, result, fetched
 
 # --- Main Handler Class ---
 
@@ -299,124 +313,60 @@ class handler(BaseHTTPRequestHandler):
         # raise Exception("DELIBERATE TEST ERROR - Check Vercel Logs")
         # -------------------------------
         
-        start_time = time.time()
-        print("--- Function Start ---", flush=True)
-        
         content_length = int(self.headers.get('Content-Length', 0))
         body = self.rfile.read(content_length)
         
         try:
             data = json.loads(body)
             url = data.get('url')
-            print(f"Received URL: {url}", flush=True)
         except json.JSONDecodeError:
-            print("ERROR: Invalid JSON received", flush=True)
-            self.send_response(400)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': 'Invalid JSON'}).encode('utf-8'))
+            log.warning('invalid_json')
+            send_json(self, 400, {'error': 'Invalid JSON'})
             return
 
-        if not url or not self.is_valid_url(url):
-            print(f"ERROR: Invalid or missing URL: {url}", flush=True)
-            self.send_response(400)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': 'Invalid or missing URL'}).encode('utf-8'))
+        if not url or not is_valid_url(url):
+            log.warning('invalid_url', url=url)
+            send_json(self, 400, {'error': 'Invalid or missing URL'})
             return
 
-        # --- Fetch HTML Content --- #
-        try:
-            print(f"Fetching HTML for: {url}", flush=True)
-            start_time = time.time()
-            response = requests.get(url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=10) # Add User-Agent
-            response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
-            html_content = response.text
-            fetch_duration = time.time() - start_time
-            print(f"HTML fetch took {fetch_duration:.2f} seconds. Status: {response.status_code}", flush=True)
-
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching URL {url}: {e}", flush=True)
-            # Return raw HTML as None and error state if fetch fails
-            self._send_response(500, {"error": f"Failed to fetch URL: {e}", "title": url, "imageUrl": None, "ingredients": []})
+        trace = RequestTrace(url)
+        status_code, result = build_recipe_meta(url, trace=trace)
+        headers = {
+            'Server-Timing': trace.server_timing(),
+            'Timing-Allow-Origin': '*', # Lets the app read the timings cross-origin
+        }
+        if result.get('retryAfter'):
+            headers['Retry-After'] = str(result['retryAfter'])
+        send_json(self, status_code, result, headers)
+
+    def do_GET(self):
+        """Reports cache and request metrics gathered from production traffic.
+
+        Anyone gets the aggregate counters. With the stats token the response adds per-host
+        metrics, site adapter hits and circuit breakers, and ?host=www.example.com narrows the
+        per-host histograms to one site.
+        """
+        if not self._has_stats_token():
+            send_json(self, 200, {
+                "cache": recipe_cache.stats() if recipe_cache else None,
+                "metrics": metrics.snapshot(per_host=False),
+                "single_flight": recipe_flights.stats(),
+                "negative_cache": negative_cache.stats() if negative_cache else None,
+            })
             return
-        except Exception as e: # Catch potential unexpected errors during fetch setup
-            print(f"Unexpected error during fetch setup for {url}: {e}", flush=True)
-            self._send_response(500, {"error": f"Unexpected error: {e}", "title": url, "imageUrl": None, "ingredients": []})
-            return
-
-        # --- Attempt Metadata Extraction --- #
-        title = url # Default title
-        image_url = None
-        ingredients = []
-        
-        # 1. Try JSON-LD
-        json_ld_data = extract_json_ld(html_content, url)
-        if json_ld_data:
-            title = json_ld_data.get('name', title)
-            image_url = get_image_url(json_ld_data, url)
-            ingredients = get_ingredients_from_json_ld(json_ld_data)
-            
-            # If JSON-LD worked, we might have found everything
-            if ingredients:
-                print(f"Success via JSON-LD for {url}", flush=True)
-                self._send_response(200, {"title": title, "imageUrl": image_url, "ingredients": ingredients})
-                return
-            else:
-                 print(f"JSON-LD found for {url}, but no ingredients. Proceeding to fallback scraping.", flush=True)
-        else:
-            print(f"No JSON-LD Recipe found for {url}, attempting fallback scraping.", flush=True)
-
-        # 2. Fallback HTML Scraping (if JSON-LD failed or yielded no ingredients)
-        # Ensure title/image from JSON-LD (if any) are kept if scraping fails later
-        try:
-            fallback_ingredients = scrape_ingredients_fallback(html_content, url)
-            # Only overwrite ingredients if fallback scraping was successful
-            if fallback_ingredients:
-                ingredients = fallback_ingredients
-                print(f"Success via Fallback Scraping for {url}", flush=True)
-            else:
-                print(f"Fallback scraping did not find ingredients for {url}", flush=True)
-            
-            # Try to find title/image via basic meta tags if JSON-LD didn't provide them
-            if title == url or not image_url:
-                 soup = BeautifulSoup(html_content, 'html.parser')
-                 if title == url:
-                     og_title = soup.find('meta', property='og:title')
-                     if og_title and og_title.get('content'):
-                         title = og_title['content']
-                     else:
-                         html_title = soup.find('title')
-                         if html_title:
-                             title = html_title.string
-                 if not image_url:
-                     og_image = soup.find('meta', property='og:image')
-                     if og_image and og_image.get('content'):
-                         image_url = urllib.parse.urljoin(url, og_image['content']) 
-
-        except Exception as e:
-            print(f"Error during fallback scraping for {url}: {e}", flush=True)
-            # Don't crash, just use whatever we got before the error (or defaults)
-            # Fallback scraping errors shouldn't prevent returning basic info + raw HTML
-
-        print(f"Final result: Title='{title}', Image={'Yes' if image_url else 'No'}, Ingredients={len(ingredients)}", flush=True)
-        # Always return raw_html, along with parsed results (which might be empty)
-        self._send_response(200, {"title": title, "imageUrl": image_url, "ingredients": ingredients})
-
-    def is_valid_url(self, url):
-        """Checks if a string is a valid HTTP/HTTPS URL."""
-        try:
-            result = urllib.parse.urlparse(url)
-            return all([result.scheme in ['http', 'https'], result.netloc]) # Check scheme too
-        except ValueError:
-            return False
-
-    def _send_response(self, status_code, body_dict):
-        """Helper to send JSON responses."""
-        self.send_response(status_code)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*') # Basic CORS for Vercel dev
-        self.end_headers()
-        self.wfile.write(json.dumps(body_dict).encode('utf-8'))
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        host = query.get('host', [None])[0]
+        send_json(self, 200, {
+            "cache": recipe_cache.stats() if recipe_cache else None,
+            "adapters": adapter_stats(),
+            "metrics": metrics.snapshot(host),
+            "single_flight": recipe_flights.stats(),
+            "negative_cache": negative_cache.stats() if negative_cache else None,
+            "circuit_breakers": host_breakers.stats(),
+        })
+
+    def _has_stats_token(self):
+        supplied = self.headers.get('Authorization', '').encode('utf-8')
+        return bool(STATS_TOKEN) and hmac.compare_digest(supplied, f'Bearer {STATS_TOKEN}'.encode('utf-8'))
 
 # This setup allows Vercel to run the handler class. 
\ No newline at end of file
@@ -0,0 +1,22 @@
+"""Request validation and JSON responses shared by the endpoint handler classes."""
+import json
+import urllib.parse
+
+def is_valid_url(url):
+    """Checks if a string is a valid HTTP/HTTPS URL, including its port if it has one."""
+    try:
+        result = urllib.parse.urlparse(url)
+        result.port # Raises ValueError for a non-numeric or out-of-range port
+        return all([result.scheme in ['http', 'https'], result.hostname])
+    except ValueError:
+        return False
+
+def send_json(handler, status_code, body_dict, headers=None):
+    """Writes a complete JSON response with basic CORS on a BaseHTTPRequestHandler."""
+    handler.send_response(status_code)
+    handler.send_header('Content-type', 'application/json')
+    handler.send_header('Access-Control-Allow-Origin', '*') # Basic CORS for Vercel dev
+    for name, value in (headers or {}).items():
+        handler.send_header(name, value)
+    handler.end_headers()
+    handler.wfile.write(json.dumps(body_dict).encode('utf-8'))
@@ -0,0 +1,135 @@
+"""Pooled keep-alive HTTP session, per-host scheduling and limits, and a deadline watchdog for streamed reads."""
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import os
+import queue
+import socket
+import threading
+import time
+import urllib.parse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+POOL_WORKERS = 8
+PER_HOST_CONCURRENCY = 2 # Don't hammer a single recipe site with a whole batch
+MAX_TRACKED_HOSTS = 1000 # Least recently used host slots are dropped beyond this
+# Seconds for one entry of a multi-URL call, counted from when it starts and covering the wait
+# for a host slot, the fetch and the parse. Shorter than the calls' budgets, so one slow site
+# fails its own entries and frees its slots instead of lasting until the whole call runs out
+PER_URL_DEADLINE = float(os.environ.get('RECIPE_PER_URL_DEADLINE', 5))
+RESULT_GRACE = 0.5 # Seconds past a call's budget for running entries to return their partial results
+
+# Module-level so warm invocations reuse keep-alive connections.
+session = requests.Session()
+session.mount('http://', HTTPAdapter(pool_connections=POOL_WORKERS, pool_maxsize=POOL_WORKERS))
+session.mount('https://', HTTPAdapter(pool_connections=POOL_WORKERS, pool_maxsize=POOL_WORKERS))
+
+_host_slots = OrderedDict()
+_host_slots_lock = threading.Lock()
+
+def host_slot(url):
+    """Returns the semaphore capping concurrent fetches to this URL's host.
+
+    Only the MAX_TRACKED_HOSTS most recently used hosts keep theirs, so a long-running server
+    doesn't grow one per host it has ever seen. A fetch holding a dropped semaphore still
+    releases it normally; the host just starts over with a fresh one.
+    """
+    host = urllib.parse.urlparse(url).hostname or ''
+    with _host_slots_lock:
+        slot = _host_slots.get(host)
+        if slot is None:
+            slot = _host_slots[host] = threading.BoundedSemaphore(PER_HOST_CONCURRENCY)
+            while len(_host_slots) > MAX_TRACKED_HOSTS:
+                _host_slots.popitem(last=False)
+        else:
+            _host_slots.move_to_end(host)
+        return slot
+
+def run_per_host(items, work, deadline, url_of=lambda item: item):
+    """Runs work(item) on a thread pool and yields (item, future) as each one finishes.
+
+    Items wait in per-host queues, not in pool workers: at most PER_HOST_CONCURRENCY items per
+    host run at once, and every host gets its first slots before any host gets more. So a
+    slow site only ever holds its own share of the workers, and entries for the other sites
+    keep starting. No item starts after `deadline` (time.monotonic()); items that haven't
+    finished RESULT_GRACE seconds past it are yielded last, with None for the future.
+    """
+    waiting = OrderedDict() # host -> deque of item indexes
+    for index, item in enumerate(items):
+        waiting.setdefault(urllib.parse.urlparse(url_of(item)).hostname or '', deque()).append(index)
+    finished = queue.Queue()
+    unfinished = set(range(len(items)))
+    running = 0
+
+    with ThreadPoolExecutor(max_workers=min(POOL_WORKERS, len(items) or 1)) as pool:
+        def start_next(host):
+            nonlocal running
+            if waiting[host] and time.monotonic() < deadline:
+                index = waiting[host].popleft()
+                running += 1
+                future = pool.submit(work, items[index])
+                future.add_done_callback(lambda future, host=host, index=index: finished.put((host, index, future)))
+
+        for _ in range(PER_HOST_CONCURRENCY):
+            for host in waiting:
+                start_next(host)
+        while running:
+            try:
+                host, index, future = finished.get(timeout=max(0, deadline + RESULT_GRACE - time.monotonic()))
+            except queue.Empty:
+                break
+            running -= 1
+            unfinished.discard(index)
+            start_next(host)
+            yield items[index], future
+        # Entries still running stop at their own deadline, which callers cap by `deadline`
+        for index in sorted(unfinished):
+            yield items[index], None
+
+class DeadlineWatchdog:
+    """Shuts a streamed response's socket down once an absolute time.monotonic() deadline passes.
+
+    The socket timeout only bounds each recv, and urllib3 keeps reading until a whole chunk
+    has arrived, so a server trickling a byte at a time could hold a read open long past the
+    deadline. Shutting the socket down wakes the blocked read, which then ends early or
+    raises. Use as a context manager around the body reads; `fired` tells the caller why the
+    body stopped. A deadline of None never fires.
+    """
+
+    def __init__(self, response, deadline):
+        self.response = response
+        self.fired = False
+        self._timer = None
+        if deadline is not None:
+            self._timer = threading.Timer(max(0, deadline - time.monotonic()), self._fire)
+            self._timer.daemon = True
+
+    def __enter__(self):
+        if self._timer is not None:
+            self._timer.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._timer is not None:
+            self._timer.cancel()
+
+    def _socket(self):
+        """The socket the body is read from, or None once it has been released."""
+        connection = getattr(self.response.raw, 'connection', None) # None once the body was fully read
+        if getattr(connection, 'sock', None) is not None:
+            return connection.sock
+        # A close-delimited body: http.client handed the socket over to the response's file object
+        body_file = getattr(getattr(self.response.raw, '_fp', None), 'fp', None)
+        return getattr(getattr(body_file, 'raw', None), '_sock', None)
+
+    def _fire(self):
+        self.fired = True
+        sock = self._socket()
+        if sock is None:
+            return
+        try:
+            # The plain socket call, so an SSL socket keeps its state and the reader gets EOF, not ValueError
+            socket.socket.shutdown(sock, socket.SHUT_RDWR)
+        except OSError:
+            pass # Already closed
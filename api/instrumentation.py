@@ -0,0 +1,275 @@
+"""Structured logging, per-request traces and aggregate metrics for the recipe endpoints.
+
+Log lines are single JSON objects on stdout. The leveled logger is quiet by default
+(RECIPE_LOG_LEVEL=WARNING), but every request still writes one 'request' trace line unless
+RECIPE_TRACE_LOG=0, and its stage timings go back to the client as a Server-Timing header.
+Counters and histograms live in the process, so they describe the traffic this warm
+instance has served.
+"""
+import bisect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import urllib.parse
+
+LOG_LEVEL = os.environ.get('RECIPE_LOG_LEVEL', 'WARNING').upper()
+TRACE_LOG = os.environ.get('RECIPE_TRACE_LOG', '1') != '0'
+
+# --- Structured Logger ---
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object: timestamp, level, logger, event and its fields."""
+
+    def format(self, record):
+        line = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        line.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            line["exc"] = self.formatException(record.exc_info)
+        return json.dumps(line, default=str, ensure_ascii=False)
+
+_root_logger = logging.getLogger('recipe')
+if not _root_logger.handlers:
+    _stream = logging.StreamHandler(sys.stdout)
+    _stream.setFormatter(JsonFormatter())
+    _root_logger.addHandler(_stream)
+    _root_logger.propagate = False # The platform's own root handler would print every line twice
+_root_logger.setLevel(getattr(logging, LOG_LEVEL, logging.WARNING))
+
+_trace_logger = logging.getLogger('recipe.trace')
+_trace_logger.setLevel(logging.INFO if TRACE_LOG else logging.CRITICAL + 1)
+
+class StructuredLogger:
+    """Leveled logger taking an event name plus keyword fields. Disabled levels cost one check."""
+
+    def __init__(self, name):
+        self._logger = logging.getLogger(f'recipe.{name}')
+
+    def _log(self, level, event, fields, exc_info=False):
+        if self._logger.isEnabledFor(level):
+            self._logger.log(level, event, extra={'fields': fields}, exc_info=exc_info)
+
+    def debug(self, event, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event, exc_info=False, **fields):
+        self._log(logging.ERROR, event, fields, exc_info)
+
+def get_logger(name):
+    return StructuredLogger(name)
+
+# --- Aggregate Metrics ---
+
+MS_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+BYTES_BUCKETS = (16 * 1024, 64 * 1024, 256 * 1024, 512 * 1024, 1024 * 1024, 2 * 1024 * 1024, 4 * 1024 * 1024)
+MAX_TRACKED_HOSTS = 200 # Later hosts are folded into 'other' to bound memory
+OTHER_HOSTS = 'other'
+ALL_HOSTS = 'all' # Label of the histograms aggregated across every host
+HOST_COUNTERS = ('requests_by_host', 'bytes_fetched_by_host')
+
+class Histogram:
+    """Fixed-bucket histogram; quantiles are the upper bound of the bucket they fall in."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= rank:
+                return self.bounds[index] if index < len(self.bounds) else round(self.max, 2)
+        return round(self.max, 2)
+
+    def as_dict(self):
+        labels = [f"le_{bound}" for bound in self.bounds] + ['le_inf']
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 2) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "max": round(self.max, 2),
+            "buckets": dict(zip(labels, self.buckets)),
+        }
+
+class Metrics:
+    """Labelled counters and histograms shared by every request this instance serves."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {} # name -> {label: count}
+        self._histograms = {} # name -> {label: Histogram}
+        self._hosts = set()
+
+    def _host_label(self, host):
+        host = host or 'unknown'
+        if host not in self._hosts and len(self._hosts) >= MAX_TRACKED_HOSTS:
+            return OTHER_HOSTS
+        self._hosts.add(host)
+        return host
+
+    def _increment(self, name, label, amount=1):
+        counter = self._counters.setdefault(name, {})
+        counter[label] = counter.get(label, 0) + amount
+
+    def _observe(self, name, label, value, bounds):
+        histograms = self._histograms.setdefault(name, {})
+        if label not in histograms:
+            histograms[label] = Histogram(bounds)
+        histograms[label].observe(value)
+
+    def increment(self, name, label, amount=1):
+        with self._lock:
+            self._increment(name, label, amount)
+
+    def record_request(self, trace):
+        """Folds one finished RequestTrace into the counters and histograms."""
+        fields = trace.fields
+        with self._lock:
+            host = self._host_label(trace.host)
+            self._increment('requests_by_status', str(trace.status_code))
+            self._increment('requests_by_endpoint', trace.endpoint)
+            self._increment('requests_by_host', host)
+            if 'cache' in fields:
+                self._increment('cache', fields['cache'])
+            if 'strategy' in fields:
+                self._increment('strategy', fields['strategy'])
+            if fields.get('coalesced'):
+                self._increment('coalesced', trace.endpoint)
+            if 'stop_reason' in fields:
+                self._increment('stop_reason', fields['stop_reason'])
+            if fields.get('bytes_fetched'):
+                self._increment('bytes_fetched_by_host', host, fields['bytes_fetched'])
+                for label in (host, ALL_HOSTS):
+                    self._observe('bytes_fetched', label, fields['bytes_fetched'], BYTES_BUCKETS)
+            if trace.parse_ms is not None:
+                for label in (host, ALL_HOSTS):
+                    self._observe('parse_ms', label, trace.parse_ms, MS_BUCKETS)
+            for stage, seconds in trace.timings.items():
+                self._observe(f'{stage}_ms', ALL_HOSTS, seconds * 1000, MS_BUCKETS)
+            for label in (host, ALL_HOSTS):
+                self._observe('total_ms', label, trace.total_ms, MS_BUCKETS)
+
+    def snapshot(self, host=None, slowest=10, per_host=True):
+        """Counters, histograms and derived rates; per-host histograms only for `host` if given.
+
+        With per_host=False nothing names a host: only the aggregate counters and histograms.
+        """
+        if not per_host:
+            host = ALL_HOSTS
+        with self._lock:
+            counters = {name: dict(values) for name, values in self._counters.items()
+                        if per_host or name not in HOST_COUNTERS}
+            histograms = {
+                name: {label: h.as_dict() for label, h in by_label.items() if host is None or label in (host, ALL_HOSTS)}
+                for name, by_label in self._histograms.items()
+            }
+            parse_by_host = self._histograms.get('parse_ms', {}) if per_host else {}
+            slowest_hosts = sorted(
+                ({"host": label, "avg_parse_ms": round(h.total / h.count, 2), "p95_parse_ms": h.quantile(0.95), "count": h.count}
+                 for label, h in parse_by_host.items() if h.count and label != ALL_HOSTS),
+                key=lambda row: row["avg_parse_ms"], reverse=True)[:slowest]
+        strategies = counters.get('strategy', {})
+        extractions = sum(strategies.values())
+        return {
+            "counters": counters,
+            "histograms": histograms,
+            "strategy_hit_rate": {name: round(count / extractions, 3) for name, count in strategies.items()} if extractions else {},
+            "slowest_hosts": slowest_hosts,
+        }
+
+metrics = Metrics() # Module-level so warm instances keep aggregating
+
+# --- Per-Request Trace ---
+
+class RequestTrace:
+    """Stage timings and outcome of one recipe request, reported as Server-Timing and one log line."""
+
+    def __init__(self, url=None, endpoint='fetch_recipe_meta'):
+        self.url = url
+        self.host = urllib.parse.urlparse(url).hostname if url else None
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.timings = {} # stage -> seconds
+        self.fields = {} # strategy, cache, bytes_fetched, stop_reason, ...
+        self.page = None
+        self.status_code = None
+        self.total_ms = None
+
+    def time(self, stage, func, *args, **kwargs):
+        stage_start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.timings[stage] = self.timings.get(stage, 0.0) + (time.perf_counter() - stage_start)
+
+    def record(self, stage, seconds):
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    def annotate(self, **fields):
+        self.fields.update(fields)
+
+    def attach(self, page):
+        """Remembers the ParsedPage so its parse time is reported once it has been built."""
+        self.page = page
+
+    @property
+    def parse_ms(self):
+        if self.page is not None and self.page.parse_duration:
+            return round(self.page.parse_duration * 1000, 2)
+        return None
+
+    def as_dict(self, page=None):
+        """Stage timings in milliseconds, as returned to the client in the response body."""
+        if page is not None:
+            self.page = page
+        timings = {stage: round(duration * 1000, 2) for stage, duration in self.timings.items()}
+        if self.parse_ms is not None:
+            timings['parse'] = self.parse_ms # Included in whichever stage parsed first
+        return timings
+
+    def server_timing(self):
+        """The Server-Timing header value: one metric per stage, the total, strategy and cache state."""
+        entries = [f"{stage};dur={duration}" for stage, duration in self.as_dict().items()]
+        if self.total_ms is not None:
+            entries.append(f"total;dur={self.total_ms}")
+        for name in ('strategy', 'cache'):
+            if name in self.fields:
+                entries.append(f'{name};desc="{self.fields[name]}"')
+        return ', '.join(entries)
+
+    def finish(self, status_code):
+        """Closes the trace: writes the request log line and updates the aggregate metrics."""
+        self.status_code = status_code
+        self.total_ms = round((time.perf_counter() - self.started) * 1000, 2)
+        metrics.record_request(self)
+        if _trace_logger.isEnabledFor(logging.INFO):
+            _trace_logger.info('request', extra={'fields': {
+                "endpoint": self.endpoint, "url": self.url, "host": self.host, "status": status_code,
+                "total_ms": self.total_ms, "timings": self.as_dict(), **self.fields}})
@@ -0,0 +1,229 @@
+"""Response cache for recipe metadata, keyed by normalised URL.
+
+Entries expire after a TTL but keep their ETag/Last-Modified validators, so a stale entry
+can be revalidated with a conditional GET instead of a full fetch and reparse.
+"""
+from collections import OrderedDict
+import json
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+
+# --- URL Normalisation ---
+
+TRACKING_PARAMS = {'fbclid', 'gclid', 'dclid', 'gbraid', 'wbraid', 'msclkid', 'yclid', 'igshid',
+                   'mc_cid', 'mc_eid', '_ga', '_gl', 'ref', 'ref_src'}
+TRACKING_PREFIXES = ('utm_',)
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+WRITABLE_DIR = '/tmp' # The only writable directory on Vercel; file-backed caches live under it
+
+def normalize_url(url):
+    """Cache key for a recipe URL: lowercased host, no fragment, default port or tracking params.
+
+    A URL whose port can't be parsed is its own key, unnormalised.
+    """
+    parts = urllib.parse.urlsplit(url.strip())
+    try:
+        port = parts.port
+    except ValueError:
+        return url.strip()
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if port and port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{port}"
+    query = [(key, value) for key, value in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+             if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)]
+    query.sort()
+    return urllib.parse.urlunsplit((scheme, host, parts.path or '/', urllib.parse.urlencode(query), ''))
+
+# --- Entries and Backends ---
+
+class CacheEntry:
+    """A cached response body plus the validators needed to revalidate it."""
+
+    def __init__(self, value, etag=None, last_modified=None, stored_at=None):
+        self.value = value
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = time.time() if stored_at is None else stored_at
+
+    def is_fresh(self, ttl):
+        return time.time() - self.stored_at < ttl
+
+    def can_revalidate(self):
+        return bool(self.etag or self.last_modified)
+
+class MemoryCacheBackend:
+    """In-process LRU store; survives only as long as the warm instance."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+class SQLiteCacheBackend:
+    """File-backed LRU store shared by every process on the same machine."""
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS recipe_cache ('
+            ' key TEXT PRIMARY KEY, value TEXT NOT NULL, etag TEXT, last_modified TEXT,'
+            ' stored_at REAL NOT NULL, accessed_at REAL NOT NULL)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS recipe_cache_accessed ON recipe_cache (accessed_at)')
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, etag, last_modified, stored_at FROM recipe_cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute('UPDATE recipe_cache SET accessed_at = ? WHERE key = ?', (time.time(), key))
+        value, etag, last_modified, stored_at = row
+        return CacheEntry(json.loads(value), etag, last_modified, stored_at)
+
+    def set(self, key, entry):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO recipe_cache VALUES (?, ?, ?, ?, ?, ?)',
+                (key, json.dumps(entry.value), entry.etag, entry.last_modified, entry.stored_at, time.time()))
+            evicted = self._conn.execute(
+                'DELETE FROM recipe_cache WHERE key IN ('
+                ' SELECT key FROM recipe_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)).rowcount
+            self.evictions += max(evicted, 0)
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute('DELETE FROM recipe_cache WHERE key = ?', (key,))
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM recipe_cache').fetchone()[0]
+
+# --- Cache Front ---
+
+class RecipeCache:
+    """TTL cache in front of the fetch-and-extract pipeline, with hit/miss/revalidate counters."""
+
+    def __init__(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._counts = {'hits': 0, 'misses': 0, 'revalidated': 0, 'changed': 0, 'stores': 0}
+
+    def lookup(self, url):
+        """Returns (state, entry) where state is 'fresh', 'stale' (revalidatable) or 'miss'."""
+        entry = self.backend.get(normalize_url(url))
+        if entry is None:
+            return 'miss', None
+        if entry.is_fresh(self.ttl):
+            return 'fresh', entry
+        if entry.can_revalidate():
+            return 'stale', entry
+        return 'miss', None
+
+    def store(self, url, value, etag=None, last_modified=None):
+        self.backend.set(normalize_url(url), CacheEntry(value, etag, last_modified))
+        self.count('stores')
+
+    def renew(self, url, entry):
+        """Marks a stale entry fresh again after the origin answered 304 Not Modified."""
+        self.backend.set(normalize_url(url), CacheEntry(entry.value, entry.etag, entry.last_modified))
+
+    def count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        lookups = counts['hits'] + counts['misses'] + counts['revalidated'] + counts['changed']
+        counts['hit_rate'] = round((counts['hits'] + counts['revalidated']) / lookups, 3) if lookups else None
+        counts['entries'] = len(self.backend)
+        counts['evictions'] = self.backend.evictions
+        counts['backend'] = type(self.backend).__name__
+        counts['ttl'] = self.ttl
+        return counts
+
+class NegativeCache:
+    """Short-lived memory of URLs that returned an HTTP error or no ingredients.
+
+    Users retrying a broken link get the same answer without another fetch. Always in memory:
+    the entries are only worth keeping for a few minutes.
+    """
+
+    def __init__(self, ttl, max_entries):
+        self.backend = MemoryCacheBackend(max_entries)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+
+    def lookup(self, url):
+        """Returns the remembered (status_code, response_dict), or None."""
+        key = normalize_url(url)
+        entry = self.backend.get(key)
+        if entry is None:
+            return None
+        if not entry.is_fresh(self.ttl):
+            self.backend.delete(key)
+            return None
+        with self._lock:
+            self.hits += 1
+        return entry.value
+
+    def store(self, url, status_code, result):
+        self.backend.set(normalize_url(url), CacheEntry((status_code, result)))
+
+    def stats(self):
+        with self._lock:
+            hits = self.hits
+        return {"hits": hits, "entries": len(self.backend), "ttl": self.ttl}
+
+def negative_cache_from_environment():
+    """Builds the negative cache configured by RECIPE_NEGATIVE_TTL (seconds, 0 disables), or None."""
+    ttl = float(os.environ.get('RECIPE_NEGATIVE_TTL', 120))
+    max_entries = int(os.environ.get('RECIPE_NEGATIVE_MAX_ENTRIES', 1024))
+    return NegativeCache(ttl, max_entries) if ttl > 0 else None
+
+def cache_from_environment():
+    """Builds the cache configured by RECIPE_CACHE_* environment variables, or None if disabled."""
+    backend_name = os.environ.get('RECIPE_CACHE_BACKEND', 'memory').lower()
+    ttl = float(os.environ.get('RECIPE_CACHE_TTL', 24 * 60 * 60))
+    max_entries = int(os.environ.get('RECIPE_CACHE_MAX_ENTRIES', 512))
+    if backend_name == 'none':
+        return None
+    if backend_name == 'sqlite':
+        path = os.environ.get('RECIPE_CACHE_PATH', os.path.join(WRITABLE_DIR, 'recipe_cache.sqlite3'))
+        return RecipeCache(SQLiteCacheBackend(path, max_entries), ttl)
+    return RecipeCache(MemoryCacheBackend(max_entries), ttl)
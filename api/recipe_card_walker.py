@@ -0,0 +1,250 @@
+"""Single-pass generic ingredient finder for recipe blogs without a site adapter.
+
+One document-order walk feeds three strategies at once, in the order they are preferred:
+
+0. Recipe card containers (WPRM, Tasty, Mediavine, ...): inside the highest-priority card,
+   collect ingredient lists (an 'ingredient' class, or introduced by an h4-h6 sibling heading)
+   and ingredient-class divs/paragraphs, stopping at the first instruction heading.
+1. An h2-h4 'Ingredients'/'Ingredienser' heading followed by a sibling list.
+2. The first div with an 'ingredient' class that holds list items or paragraphs.
+
+Sibling headings, list membership and "does this div contain a list" are tracked as the walk
+goes, so no element triggers its own search of the tree.
+"""
+import re
+
+from bs4 import Tag
+
+CARD_CLASSES = ['wprm-recipe-container', 'tasty-recipe', 'tasty-recipes', 'mv-recipe-card', 'recipe-card', 'jetpack-recipe']
+INSTRUCTION_KEYWORDS = re.compile(r'instruction|method|anvisning|gör så här|directions|preparation', re.IGNORECASE)
+INGREDIENT_HEADING = re.compile(r'ingredient|ingredienser', re.IGNORECASE)
+INGREDIENT_CLASS = re.compile(r'ingredient', re.IGNORECASE)
+MAX_CARD_ELEMENT_TEXT = 150 # Longer ingredient-class text is probably the whole section
+
+LIST_TAGS = {'ul', 'ol'}
+HEADING_TAGS = {'h2', 'h3', 'h4', 'h5', 'h6'}
+SIBLING_HEADING_TAGS = {'h4', 'h5', 'h6'} # Headings that introduce an ingredient sub-list
+PAGE_HEADING_TAGS = {'h2', 'h3', 'h4'}
+
+class _ListFrame:
+    """An open ingredient list: its <li> texts come first, then whatever was found inside it."""
+
+    def __init__(self, element):
+        self.element = element
+        self.li_texts = []
+        self.deferred = []
+
+class _Placeholder:
+    """Keeps an ingredient-class div/p in document order until we know whether it holds a list."""
+
+    def __init__(self, element):
+        self.element = element
+        self.has_list = False
+        self.text = None
+
+class _CardCollector:
+    """Strategy 0 state for one card container, fed every element inside it in document order."""
+
+    def __init__(self, container, walker):
+        self.container = container
+        self.walker = walker
+        self.out = []
+        self.frames = []
+        self.placeholders = []
+        self.stopped = False
+        self.closed = False
+
+    def _emit(self, items):
+        (self.frames[-1].deferred if self.frames else self.out).extend(items)
+
+    def open(self, element):
+        name = element.name
+        if name in LIST_TAGS:
+            for placeholder in self.placeholders:
+                placeholder.has_list = True
+        if self.stopped:
+            return
+        if name in HEADING_TAGS and INSTRUCTION_KEYWORDS.search(self.walker.text_of(element)):
+            self.stopped = True # Lists already open still get all their items, nothing new is collected
+            return
+        if name in LIST_TAGS:
+            if self._is_ingredient_list(element):
+                self.frames.append(_ListFrame(element))
+        elif name in ('div', 'p'):
+            classes = element.get('class') or []
+            if INGREDIENT_CLASS.search(' '.join(classes)) and not any(c in CARD_CLASSES for c in classes):
+                placeholder = _Placeholder(element)
+                self.placeholders.append(placeholder)
+                self._emit([placeholder])
+
+    def add_li(self, text):
+        for frame in self.frames:
+            frame.li_texts.append(text)
+
+    def close(self, element):
+        if element is self.container:
+            self.closed = True
+        elif self.frames and self.frames[-1].element is element:
+            frame = self.frames.pop()
+            self._emit(frame.li_texts + frame.deferred)
+        elif self.placeholders and self.placeholders[-1].element is element:
+            placeholder = self.placeholders.pop()
+            if not placeholder.has_list:
+                text = self.walker.clean(element.get_text())
+                if text and len(text) < MAX_CARD_ELEMENT_TEXT:
+                    placeholder.text = text
+
+    def _is_ingredient_list(self, element):
+        if any('ingredient' in c.lower() for c in element.get('class') or []):
+            return True
+        heading = self.walker.previous_sibling_heading(element)
+        return heading is not None and not INSTRUCTION_KEYWORDS.search(self.walker.text_of(heading))
+
+    def ingredients(self):
+        texts = []
+        for item in self.out:
+            text = item.text if isinstance(item, _Placeholder) else item
+            if text:
+                texts.append(text)
+        return list(dict.fromkeys(texts)) # Remove duplicates while preserving order
+
+class GenericRecipeWalker:
+    """Walks a parsed page once and returns ingredients from the best generic strategy."""
+
+    def __init__(self, soup, clean):
+        self.soup = soup
+        self.clean = clean
+        self._texts = {}
+        self._last_sibling_heading = {} # id(parent) -> latest h4-h6 child seen so far
+        self._pending_headings = {} # id(parent) -> ingredient headings still waiting for a sibling list
+        self.cards = {} # card class -> collector for the first div carrying it
+        self.heading_lists = [] # (heading, list_texts or None) in document order
+        self.ingredient_divs = [] # [direct_texts or None, descendant li texts] in document order
+
+    def text_of(self, element):
+        key = id(element)
+        if key not in self._texts:
+            self._texts[key] = element.get_text()
+        return self._texts[key]
+
+    def previous_sibling_heading(self, element):
+        return self._last_sibling_heading.get(id(element.parent))
+
+    def run(self):
+        """Returns (ingredients, strategy name or None)."""
+        self._walk()
+        return self._choose()
+
+    def _walk(self):
+        active_cards = []
+        heading_lists = [] # Open lists that follow an ingredient heading
+        open_divs = [] # Open ingredient-class divs (strategy 2)
+        close_stack = [] # (element, closers) for open tags that need work on close
+        iterators = [iter(self.soup.contents)]
+        parents = [self.soup]
+
+        while iterators:
+            node = next(iterators[-1], None)
+            if node is None:
+                iterators.pop()
+                element = parents.pop()
+                if close_stack and close_stack[-1][0] is element:
+                    for closer in close_stack.pop()[1]:
+                        closer(element)
+                    if self._best_card_done(element):
+                        return
+                continue
+            if not isinstance(node, Tag):
+                continue
+
+            name = node.name
+            closers = []
+            parent_key = id(node.parent)
+
+            # --- Strategy 0: recipe card containers ---
+            if name == 'div':
+                for card_class in node.get('class') or []:
+                    if card_class in CARD_CLASSES and card_class not in self.cards:
+                        collector = _CardCollector(node, self)
+                        self.cards[card_class] = collector
+                        active_cards.append(collector)
+                        closers.append(collector.close)
+            for collector in active_cards:
+                if not collector.closed and collector.container is not node:
+                    collector.open(node)
+                    closers.append(collector.close)
+
+            # --- Heading context shared by strategies 0 and 1 ---
+            if name in SIBLING_HEADING_TAGS:
+                self._last_sibling_heading[parent_key] = node
+            if name in PAGE_HEADING_TAGS and node.string and INGREDIENT_HEADING.search(node.string):
+                entry = [node, None]
+                self.heading_lists.append(entry)
+                self._pending_headings.setdefault(parent_key, []).append(entry)
+            if name in LIST_TAGS and parent_key in self._pending_headings:
+                texts = []
+                for entry in self._pending_headings.pop(parent_key):
+                    entry[1] = texts # Every heading waiting on this parent resolves to this list
+                heading_lists.append((node, texts))
+                closers.append(lambda element: heading_lists.pop())
+
+            # --- Strategy 2: ingredient-class divs ---
+            if name == 'div' and any(INGREDIENT_CLASS.search(c) for c in node.get('class') or []):
+                entry = [None, []]
+                self.ingredient_divs.append(entry)
+                open_divs.append((node, entry))
+                closers.append(lambda element: open_divs.pop())
+            if name in ('li', 'p') and open_divs and open_divs[-1][0] is node.parent:
+                entry = open_divs[-1][1]
+                if entry[0] is None:
+                    entry[0] = []
+                text = self._clean_text(node)
+                if text:
+                    entry[0].append(text)
+
+            # --- List items feed every open list being tracked ---
+            if name == 'li' and (active_cards or heading_lists or open_divs):
+                text = self._clean_text(node)
+                if text:
+                    for collector in active_cards:
+                        collector.add_li(text)
+                    for _, texts in heading_lists:
+                        texts.append(text)
+                    for _, entry in open_divs:
+                        entry[1].append(text)
+
+            if closers:
+                close_stack.append((node, closers))
+            iterators.append(iter(node.contents))
+            parents.append(node)
+
+    def _clean_text(self, element):
+        key = ('clean', id(element))
+        if key not in self._texts:
+            self._texts[key] = self.clean(element.get_text())
+        return self._texts[key]
+
+    def _best_card_done(self, closed_element):
+        """True once the top-priority card has been collected with results, so nothing later can win."""
+        best = self.cards.get(CARD_CLASSES[0])
+        return best is not None and best.container is closed_element and bool(best.ingredients())
+
+    def _choose(self):
+        for card_class in CARD_CLASSES:
+            if card_class in self.cards:
+                ingredients = self.cards[card_class].ingredients()
+                if ingredients:
+                    return ingredients, f'card:{card_class}'
+                break # Only the highest-priority card is considered, as before
+        for heading, texts in self.heading_lists:
+            if texts:
+                return list(texts), 'heading'
+        for direct_texts, li_texts in self.ingredient_divs:
+            texts = direct_texts if direct_texts is not None else li_texts
+            if texts:
+                return list(texts), 'div_class'
+        return [], None
+
+def scrape_generic_ingredients(soup, clean):
+    """Returns (ingredients, strategy) from one walk over the page."""
+    return GenericRecipeWalker(soup, clean).run()
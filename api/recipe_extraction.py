@@ -0,0 +1,389 @@
+"""The recipe extraction pipeline: from a page's HTML to its title, image and ingredients.
+
+Shared by the HTTP endpoints (fetch_recipe_meta, refresh_recipes) and the offline bulk
+extractor (bulk_extract.py). Nothing here does network I/O: callers fetch or read the page,
+decode it with sniff_charset/decode_body, wrap it in a ParsedPage and call extract_recipe_meta.
+"""
+import codecs
+import hashlib
+import html
+import importlib.util
+import json
+import os
+import re
+import sys
+import time
+import urllib.parse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__))) # Let the module import its siblings
+from instrumentation import get_logger
+from site_adapters import find_adapter
+
+# bs4, lxml and the generic fallback walker are imported on first parse, not at cold start:
+# most pages are answered from JSON-LD with regexes alone. Slim builds ship without lxml
+# (see requirements-slim.txt); RECIPE_HTML_PARSER forces a backend either way.
+HTML_PARSER = os.environ.get('RECIPE_HTML_PARSER') or (
+    'lxml' if importlib.util.find_spec('lxml') is not None else 'html.parser')
+
+log = get_logger('recipe_extraction')
+
+# --- Shared Parsed Document ---
+
+class ParsedPage:
+    """A fetched page whose HTML is parsed at most once and shared by every extraction stage."""
+
+    def __init__(self, html_content, url):
+        self.html = html_content
+        self.url = url
+        self.parse_duration = 0.0
+        self._soup = None
+
+    @property
+    def soup(self):
+        """The BeautifulSoup tree, built on first access with the fastest available parser."""
+        if self._soup is None:
+            from bs4 import BeautifulSoup
+            parse_start = time.perf_counter()
+            self._soup = BeautifulSoup(self.html, HTML_PARSER)
+            self.parse_duration = time.perf_counter() - parse_start
+            log.debug('parsed', url=self.url, parser=HTML_PARSER, parse_ms=round(self.parse_duration * 1000, 2))
+        return self._soup
+
+# --- Helper Functions for Parsing ---
+
+# --- Lightweight JSON-LD Recipe Extraction ---
+# Scans only the <script type="application/ld+json"> blocks in the raw HTML, so the common
+# success path never builds a document tree.
+
+JSON_LD_SCRIPT_RE = re.compile(
+    r'<script\b[^>]*\btype\s*=\s*["\']?application/ld\+json["\']?[^>]*>(.*?)</script\s*>',
+    re.IGNORECASE | re.DOTALL)
+JSON_LD_WRAPPER_RE = re.compile(r'<!--|-->|<!\[CDATA\[|\]\]>') # Only the markers; what they wrap is the JSON
+# Strings are matched first and kept as they are, so "/*", "//" and ",]" inside them survive
+JSON_LD_REPAIR_RE = re.compile(r'("(?:[^"\\]|\\.)*")|^[ \t]*//[^\n]*|/\*.*?\*/|,(?=\s*[}\]])',
+                               re.MULTILINE | re.DOTALL)
+SCHEMA_ORG_PREFIX_RE = re.compile(r'^https?://schema\.org/', re.IGNORECASE)
+RECIPE_NESTING_KEYS = ('@graph', 'mainEntity', 'mainEntityOfPage')
+
+def _iter_json_ld_scripts(html_content):
+    """Yields the raw body of each JSON-LD script block in document order."""
+    for match in JSON_LD_SCRIPT_RE.finditer(html_content):
+        yield match.group(1)
+
+def _load_json_ld_block(script_text):
+    """Decodes one JSON-LD script body, repairing the common kinds of broken JSON on failure."""
+    try:
+        # strict=False already accepts raw newlines and tabs inside strings
+        return json.loads(script_text, strict=False)
+    except ValueError:
+        pass
+    repaired = _repair_json_ld(script_text)
+    try:
+        return json.loads(repaired, strict=False)
+    except ValueError:
+        if not ('&quot;' in script_text or '&#' in script_text or '&amp;' in script_text):
+            raise
+    # Entity-encoded JSON from some CMS templates. Only tried last: unescaping first would turn
+    # an &quot; inside a string value into a bare quote and break JSON that needed no decoding
+    return json.loads(_repair_json_ld(html.unescape(script_text)), strict=False)
+
+def _repair_json_ld(script_text):
+    """Strips comment and CDATA wrappers, comments and trailing commas outside strings."""
+    repaired = JSON_LD_WRAPPER_RE.sub('', script_text)
+    return JSON_LD_REPAIR_RE.sub(lambda match: match.group(1) or '', repaired).strip()
+
+def _is_recipe_type(item_type):
+    """True for 'Recipe', schema.org URIs of it, or a list of types containing either."""
+    types = item_type if isinstance(item_type, list) else [item_type]
+    return any(isinstance(t, str) and SCHEMA_ORG_PREFIX_RE.sub('', t) == 'Recipe' for t in types)
+
+def _find_recipe_node(data):
+    """Walks lists, @graph containers and mainEntity links; returns the first Recipe dict found."""
+    pending = [data]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, list):
+            pending.extend(reversed(node)) # Keep document order
+        elif isinstance(node, dict):
+            if _is_recipe_type(node.get('@type')):
+                return node
+            for key in reversed(RECIPE_NESTING_KEYS):
+                if key in node:
+                    pending.append(node[key])
+    return None
+
+def find_json_ld_recipe(html_content, url=None):
+    """Returns the first JSON-LD Recipe object in the page, decoding blocks lazily, or None."""
+    for script_text in _iter_json_ld_scripts(html_content):
+        if 'Recipe' not in script_text:
+            continue # Cheap pre-check: skip decoding Organization/BreadcrumbList-only blocks
+        try:
+            data = _load_json_ld_block(script_text)
+        except ValueError as e:
+            log.info('json_ld_undecodable', url=url, error=str(e))
+            continue
+        recipe = _find_recipe_node(data)
+        if recipe is not None:
+            return recipe
+    return None
+
+def extract_json_ld(page):
+    """Extracts JSON-LD metadata, specifically looking for Recipe schema."""
+    url = page.url
+    try:
+        recipe = find_json_ld_recipe(page.html, url)
+        log.debug('json_ld', url=url, found=recipe is not None)
+        return recipe # The whole recipe object, or None
+    except Exception as e:
+        log.error('json_ld_failed', url=url, error=str(e))
+        return None
+
+def get_image_url(recipe_data, source_url):
+    """Extracts image URL from JSON-LD data (can be complex)."""
+    if not recipe_data or not isinstance(recipe_data, dict):
+        return None
+
+    image_info = recipe_data.get('image')
+    
+    if not image_info:
+        return None
+
+    # Handle various image structures used by schema.org
+    if isinstance(image_info, str):
+        return urllib.parse.urljoin(source_url, image_info) # Make relative URLs absolute
+    elif isinstance(image_info, dict):
+        # Common patterns: {'url': '...'}, {'@id': '...'}
+        img_url = image_info.get('url') or image_info.get('@id')
+        return urllib.parse.urljoin(source_url, img_url) if img_url else None
+    elif isinstance(image_info, list) and image_info:
+        # Take the first image if it's a list
+        first_image = image_info[0]
+        if isinstance(first_image, str):
+             return urllib.parse.urljoin(source_url, first_image)
+        elif isinstance(first_image, dict):
+             img_url = first_image.get('url') or first_image.get('@id')
+             return urllib.parse.urljoin(source_url, img_url) if img_url else None
+            
+    return None # No usable image found
+
+WHITESPACE_RE = re.compile(r'\s+') # Also matches non-breaking spaces and newlines inside ingredient text
+
+def get_ingredients_from_json_ld(recipe_data):
+    """Extracts ingredients from the 'recipeIngredient' field."""
+    if not recipe_data or not isinstance(recipe_data, dict):
+        return []
+        
+    ingredients = recipe_data.get('recipeIngredient', [])
+    if isinstance(ingredients, list) and all(isinstance(i, str) for i in ingredients):
+         # Basic cleaning: remove extra whitespace
+         return [WHITESPACE_RE.sub(' ', ing).strip() for ing in ingredients if ing.strip()]
+    else:
+        log.debug('json_ld_without_ingredients')
+        return []
+
+def clean_ingredient_text(text):
+    """Cleans up extracted ingredient text."""
+    # Remove leading/trailing whitespace, condense multiple spaces, remove potential unicode noise
+    cleaned = WHITESPACE_RE.sub(' ', text).strip()
+    # Optional: remove common instructional prefixes if needed (e.g., "Optional:", "For the sauce:")
+    # cleaned = re.sub(r'^Optional:|^For the [^:]+:', '', cleaned, flags=re.IGNORECASE).strip()
+    return cleaned
+
+def scrape_ingredients_fallback(page):
+    """Fallback HTML scraping for specific sites and generic patterns. Returns (ingredients, strategy)."""
+    url = page.url
+    soup = page.soup
+    ingredients = []
+    strategy = None
+    
+    hostname = urllib.parse.urlparse(url).hostname
+
+    try:
+        # --- Site Adapters (ICA, Köket, Arla, Coop, ... see site_adapters.py) ---
+        # A matched adapter owns the page: its result is final, generic heuristics are skipped
+        adapter = find_adapter(hostname)
+        if adapter:
+            ingredients = adapter.extract_ingredients(soup, clean_ingredient_text)
+            log.debug('fallback', url=url, adapter=adapter.name, found=len(ingredients))
+            return ingredients, f'adapter:{adapter.name}' if ingredients else None
+
+        # --- Generic Blog Fallback (no adapter for this site) ---
+        # Recipe card, ingredient heading and ingredient-class strategies share one walk of the page
+        from recipe_card_walker import scrape_generic_ingredients
+        ingredients, strategy = scrape_generic_ingredients(soup, clean_ingredient_text)
+        log.debug('fallback', url=url, strategy=strategy, found=len(ingredients))
+
+    except Exception as e:
+        log.error('fallback_failed', url=url, error=str(e))
+        # Don't crash, just return empty list if scraping fails
+
+    return [ing for ing in ingredients if ing], strategy # Final filter for empty strings
+
+def extract_meta_tags(page):
+    """Reads og:title/<title> and og:image from the shared document. Returns (title, image_url)."""
+    soup = page.soup
+    adapter = find_adapter(urllib.parse.urlparse(page.url).hostname)
+    if adapter:
+        image_url = adapter.extract_image(soup)
+        return adapter.extract_title(soup), urllib.parse.urljoin(page.url, image_url) if image_url else None
+    title = None
+    og_title = soup.find('meta', property='og:title')
+    if og_title and og_title.get('content'):
+        title = og_title['content']
+    else:
+        html_title = soup.find('title')
+        if html_title:
+            title = html_title.string
+    image_url = None
+    og_image = soup.find('meta', property='og:image')
+    if og_image and og_image.get('content'):
+        image_url = urllib.parse.urljoin(page.url, og_image['content'])
+    return title, image_url
+
+# Regex versions of the og:title/<title>/og:image lookups, used when the deadline budget leaves
+# no time to build a document tree. They only look at the <head>.
+META_TAG_RE = re.compile(r'<meta\b[^>]*>', re.IGNORECASE)
+TAG_ATTRIBUTE_RE = re.compile(r'([\w:-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))')
+TITLE_TAG_RE = re.compile(r'<title\b[^>]*>(.*?)</title\s*>', re.IGNORECASE | re.DOTALL)
+HEAD_END_TEXT_RE = re.compile(r'</head\s*>', re.IGNORECASE)
+
+def extract_head_meta(html_content, url):
+    """Reads og:title/<title> and og:image from the page's <head> without parsing it. Returns (title, image_url)."""
+    head_end = HEAD_END_TEXT_RE.search(html_content)
+    head = html_content[:head_end.start()] if head_end else html_content
+    properties = {}
+    for tag in META_TAG_RE.finditer(head):
+        attributes = {name.lower(): double or single or bare
+                      for name, double, single, bare in TAG_ATTRIBUTE_RE.findall(tag.group(0))}
+        name = attributes.get('property', '').lower()
+        if name in ('og:title', 'og:image') and attributes.get('content') and name not in properties:
+            properties[name] = html.unescape(attributes['content'])
+    title = properties.get('og:title')
+    if not title:
+        match = TITLE_TAG_RE.search(head)
+        title = html.unescape(match.group(1)).strip() if match and match.group(1).strip() else None
+    image_url = properties.get('og:image')
+    return title, urllib.parse.urljoin(url, image_url) if image_url else None
+
+def has_recipe_ingredients(script_text):
+    """True if one JSON-LD script body decodes to a Recipe that lists ingredients."""
+    try:
+        recipe = _find_recipe_node(_load_json_ld_block(script_text))
+    except ValueError:
+        return False
+    return recipe is not None and bool(recipe.get('recipeIngredient'))
+
+# --- Page Decoding ---
+# The charset comes from the headers or <meta charset> only, never from guessing at content.
+
+CHARSET_SNIFF_BYTES = 4096
+
+HEADER_CHARSET_RE = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+META_CHARSET_RE = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+
+def _valid_codec(name):
+    try:
+        return codecs.lookup(name).name
+    except (LookupError, TypeError):
+        return None
+
+def sniff_charset(content_type, head_bytes):
+    """Returns the declared charset from the Content-Type header or a <meta> tag, or None."""
+    if content_type:
+        match = HEADER_CHARSET_RE.search(content_type)
+        if match and _valid_codec(match.group(1)):
+            return _valid_codec(match.group(1))
+    if head_bytes.startswith(codecs.BOM_UTF8):
+        return 'utf-8'
+    match = META_CHARSET_RE.search(head_bytes[:CHARSET_SNIFF_BYTES])
+    if match:
+        return _valid_codec(match.group(1).decode('ascii', 'ignore'))
+    return None
+
+def decode_body(body, encoding):
+    """Decodes body bytes without content-based detection; undeclared pages are tried as UTF-8."""
+    if encoding:
+        return body.decode(encoding, errors='replace')
+    try:
+        return body.decode('utf-8')
+    except UnicodeDecodeError as e:
+        if e.start >= len(body) - 3:
+            return body.decode('utf-8', errors='replace') # Multi-byte sequence cut by an early stop
+        return body.decode('windows-1252', errors='replace')
+
+# --- Content Hashing ---
+# Lets clients ask "has this recipe changed?". Only the fields we return are hashed, after
+# extraction, so CSRF tokens, nonces, ad ids, rating counts and dateModified bumps in the page
+# never count as changes, whichever strategy found the recipe.
+
+HASHED_RECIPE_FIELDS = ('title', 'imageUrl', 'ingredients')
+
+def recipe_content_hash(result):
+    """Stable hash of the recipe fields in an extract_recipe_meta result."""
+    source = json.dumps({key: result.get(key) for key in HASHED_RECIPE_FIELDS}, sort_keys=True)
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()[:32]
+
+# --- Extraction ---
+
+MIN_PARSE_BUDGET = 0.5 # Seconds that must be left to start building a document tree
+
+def extract_recipe_meta(page, trace, deadline=None):
+    """Runs JSON-LD, then fallback scraping and meta tags on one page. Returns the response fields.
+
+    Stage timings and the strategy that found the ingredients are recorded in `trace`. When
+    too little of the time.monotonic() `deadline` is left to parse the page, the fallback is
+    skipped and the result has "partial": True with the title and image from the <head>.
+    """
+    url = page.url
+
+    # --- Attempt Metadata Extraction --- #
+    title = url # Default title
+    image_url = None
+    ingredients = []
+    strategy = None
+    
+    # 1. Try JSON-LD
+    json_ld_data = trace.time('json_ld', extract_json_ld, page)
+    if json_ld_data:
+        title = json_ld_data.get('name', title)
+        image_url = get_image_url(json_ld_data, url)
+        ingredients = get_ingredients_from_json_ld(json_ld_data)
+        
+        # If JSON-LD worked, we might have found everything
+        if ingredients:
+            trace.annotate(strategy='json_ld')
+            return {"title": title, "imageUrl": image_url, "ingredients": ingredients}
+
+    # The budget is spent: answer with what the <head> says instead of parsing the whole page
+    if deadline is not None and deadline - time.monotonic() < MIN_PARSE_BUDGET:
+        if title == url or not image_url:
+            head_title, head_image_url = trace.time('meta', extract_head_meta, page.html, url)
+            title = head_title if title == url and head_title else title
+            image_url = image_url or head_image_url
+        trace.annotate(strategy='none', partial=True)
+        return {"title": title, "imageUrl": image_url, "ingredients": ingredients, "partial": True}
+
+    # 2. Fallback HTML Scraping (if JSON-LD failed or yielded no ingredients)
+    # Ensure title/image from JSON-LD (if any) are kept if scraping fails later
+    try:
+        fallback_ingredients, strategy = trace.time('fallback', scrape_ingredients_fallback, page)
+        # Only overwrite ingredients if fallback scraping was successful
+        if fallback_ingredients:
+            ingredients = fallback_ingredients
+        
+        # Try to find title/image via basic meta tags if JSON-LD didn't provide them
+        if title == url or not image_url:
+             meta_title, meta_image_url = trace.time('meta', extract_meta_tags, page)
+             if title == url and meta_title:
+                 title = meta_title
+             if not image_url:
+                 image_url = meta_image_url
+
+    except Exception as e:
+        log.error('extraction_failed', exc_info=True, url=url, error=str(e))
+        # Don't crash, just use whatever we got before the error (or defaults)
+        # Fallback scraping errors shouldn't prevent returning basic info + raw HTML
+
+    trace.annotate(strategy=strategy or 'none')
+    # Always return the parsed results (which might be empty)
+    return {"title": title, "imageUrl": image_url, "ingredients": ingredients}
@@ -0,0 +1,165 @@
+from http.server import BaseHTTPRequestHandler
+import json
+import os
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__))) # Let the function import its sibling modules
+from fetch_recipe_meta import DeadlineExceeded, fetch_html, host_breakers, recipe_cache, record_fetch_error
+from http_helpers import is_valid_url, send_json
+from http_pool import PER_URL_DEADLINE, host_slot, run_per_host, session
+from instrumentation import RequestTrace, get_logger
+from recipe_extraction import ParsedPage, extract_recipe_meta, recipe_content_hash
+from thumbnail import thumbnail_urls
+
+log = get_logger('refresh_recipes')
+
+# --- Refresh Settings ---
+
+MAX_REFRESH_RECIPES = 500
+REFRESH_BUDGET = float(os.environ.get('RECIPE_REFRESH_BUDGET', 8)) # Seconds for the whole call, under Vercel's 10 s limit
+
+def check_recipe(saved, budget_deadline=None):
+    """Checks one saved recipe against its source. Returns (state, delta_dict).
+
+    state is 'unchanged', 'changed', 'failed' or 'pending'. The conditional GET uses the
+    validators the client last saw; a 200 is extracted and compared by content hash. An
+    unchanged recipe whose validators moved comes back with the new ones, so the next check
+    can be a 304. 'pending' means the call's time.monotonic() `budget_deadline` ran out before
+    the check could finish, which says nothing about the recipe.
+    """
+    trace = RequestTrace(saved['url'], endpoint='refresh_recipes')
+    state = 'failed'
+    try:
+        state, delta = _check_recipe(saved, trace, budget_deadline)
+        return state, delta
+    finally:
+        trace.annotate(refresh=state)
+        trace.finish(200 if state != 'failed' else 500)
+
+def _unchanged(saved, fetched):
+    """('unchanged', delta) with the response's validators when they differ from the saved ones."""
+    etag = fetched.headers.get('ETag') or saved.get('etag')
+    last_modified = fetched.headers.get('Last-Modified') or saved.get('lastModified')
+    if (etag, last_modified) == (saved.get('etag'), saved.get('lastModified')):
+        return 'unchanged', None
+    return 'unchanged', {"url": saved['url'], "etag": etag, "lastModified": last_modified}
+
+def _check_recipe(saved, trace, budget_deadline):
+    url = saved['url']
+    conditional_headers = {}
+    if saved.get('etag'):
+        conditional_headers['If-None-Match'] = saved['etag']
+    if saved.get('lastModified'):
+        conditional_headers['If-Modified-Since'] = saved['lastModified']
+
+    deadline = time.monotonic() + PER_URL_DEADLINE
+    if budget_deadline is not None:
+        deadline = min(deadline, budget_deadline)
+    slot = host_slot(url)
+    if not slot.acquire(timeout=max(0, deadline - time.monotonic())):
+        if deadline == budget_deadline:
+            return 'pending', {"url": url}
+        return 'failed', {"url": url, "error": "Timed out waiting for a connection slot"}
+    breaker = host_breakers.for_url(url)
+    try:
+        if not breaker.allow():
+            return 'failed', {"url": url, "error": "Recipe site is failing, try again shortly"}
+        fetched = trace.time('fetch', fetch_html, url, session=session, deadline=deadline,
+                             extra_headers=conditional_headers)
+        breaker.record_success()
+    except requests.exceptions.RequestException as e:
+        record_fetch_error(breaker, e)
+        if isinstance(e, DeadlineExceeded) and deadline == budget_deadline:
+            return 'pending', {"url": url}
+        log.warning('refresh_fetch_failed', url=url, error=str(e))
+        return 'failed', {"url": url, "error": f"Failed to fetch URL: {e}"}
+    except Exception:
+        breaker.record_failure()
+        raise
+    finally:
+        slot.release()
+
+    trace.annotate(http_status=fetched.status_code, bytes_fetched=fetched.bytes_read, stop_reason=fetched.stop_reason)
+    if fetched.status_code == 304:
+        return _unchanged(saved, fetched)
+
+    page = ParsedPage(fetched.html, url)
+    trace.attach(page)
+    result = extract_recipe_meta(page, trace, deadline)
+    if result.get("partial"):
+        if deadline == budget_deadline:
+            return 'pending', {"url": url}
+        return 'failed', {"url": url, "error": "Ran out of time extracting the recipe"}
+    content_hash = recipe_content_hash(result)
+    if content_hash == saved.get('contentHash'):
+        return _unchanged(saved, fetched)
+    result.update({
+        "etag": fetched.headers.get('ETag'),
+        "lastModified": fetched.headers.get('Last-Modified'),
+        "contentHash": content_hash,
+    })
+    if recipe_cache and result["ingredients"]:
+        recipe_cache.store(url, result, result["etag"], result["lastModified"])
+    return 'changed', {"url": url, **result, "thumbnails": thumbnail_urls(result["imageUrl"]), "timings": trace.as_dict(page)}
+
+# --- Main Handler Class ---
+
+class handler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        content_length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(content_length)
+
+        try:
+            recipes = json.loads(body).get('recipes')
+        except (json.JSONDecodeError, AttributeError):
+            log.warning('invalid_json')
+            send_json(self, 400, {'error': 'Invalid JSON'})
+            return
+
+        if not isinstance(recipes, list):
+            send_json(self, 400, {'error': 'Expected a "recipes" list'})
+            return
+        if len(recipes) > MAX_REFRESH_RECIPES:
+            send_json(self, 400, {'error': f'At most {MAX_REFRESH_RECIPES} recipes per refresh'})
+            return
+
+        # One check per distinct valid URL; the client keys its deltas by URL
+        saved_by_url = {}
+        for saved in recipes:
+            if isinstance(saved, dict) and isinstance(saved.get('url'), str) and is_valid_url(saved['url']):
+                saved_by_url.setdefault(saved['url'], saved)
+
+        # Checks still waiting when the budget runs out come back as "pending" for the client to resend
+        budget_deadline = time.monotonic() + REFRESH_BUDGET
+        changed, failed, revalidated, pending, unchanged = [], [], [], [], 0
+        checks = run_per_host(list(saved_by_url.values()), lambda saved: self._check_safely(saved, budget_deadline),
+                              budget_deadline, url_of=lambda saved: saved['url'])
+        for saved, future in checks:
+            state, delta = future.result() if future is not None else ('pending', {"url": saved['url']})
+            if state == 'changed':
+                changed.append(delta)
+            elif state == 'failed':
+                failed.append(delta)
+            elif state == 'pending':
+                pending.append(delta["url"])
+            else:
+                unchanged += 1
+                if delta:
+                    revalidated.append(delta)
+
+        log.info('refresh_done', changed=len(changed), unchanged=unchanged, failed=len(failed), pending=len(pending))
+        send_json(self, 200, {"changed": changed, "failed": failed, "unchanged": unchanged,
+                              "revalidated": revalidated, "pending": pending})
+
+    def _check_safely(self, saved, budget_deadline):
+        try:
+            return check_recipe(saved, budget_deadline)
+        except Exception as e:
+            log.error('refresh_failed', exc_info=True, url=saved['url'], error=str(e))
+            return 'failed', {"url": saved['url'], "error": f"Unexpected error: {e}"}
+
+# This setup allows Vercel to run the handler class.
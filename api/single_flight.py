@@ -0,0 +1,56 @@
+"""Single-flight coalescing: concurrent calls for the same key share one execution.
+
+When many users paste the same trending recipe at once, the first request (the leader) runs
+the fetch and parse and every request that arrives while it is running waits for that
+result instead of starting its own.
+"""
+import threading
+
+class _Flight:
+    """One in-progress call and the outcome its waiters will receive."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Deduplicates concurrent calls by key. Results are not kept once the call finishes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key, func, *args):
+        """Runs func(*args), or waits for the running call with the same key. Returns (result, shared)."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = func(*args)
+            return flight.result, False
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {"leaders": self.leaders, "coalesced": self.coalesced, "in_flight": len(self._flights)}
@@ -0,0 +1,173 @@
+"""Registry of per-site recipe scrapers, keyed by registrable domain.
+
+Each adapter declares CSS selectors for its ingredient section, the ingredient items inside
+it, and the title and image. They are compiled once, on the adapter's first use, so importing
+the registry stays cheap for requests that never reach the HTML fallback. Supporting a new
+site means registering one more SiteAdapter here; the handler never needs to change.
+"""
+import threading
+import time
+
+# Suffixes where the registrable domain has three labels instead of two
+MULTI_LABEL_SUFFIXES = {'co.uk', 'org.uk', 'com.au', 'co.nz'}
+
+def registrable_domain(hostname):
+    """'www.ica.se' -> 'ica.se'. Good enough for the sites we support without a suffix list."""
+    labels = (hostname or '').lower().rstrip('.').split('.')
+    keep = 3 if '.'.join(labels[-2:]) in MULTI_LABEL_SUFFIXES else 2
+    return '.'.join(labels[-keep:])
+
+class _CompiledRules:
+    """The soupsieve-compiled form of one adapter's selectors."""
+
+    def __init__(self, adapter):
+        import soupsieve # Deferred with bs4: only pages without a JSON-LD recipe need it
+        compile_optional = lambda selector: soupsieve.compile(selector) if selector else None
+        self.section_selectors = [soupsieve.compile(selector) for selector in adapter.section_selectors]
+        self.item_selector = soupsieve.compile(adapter.item_selector)
+        self.fallback_item_selector = compile_optional(adapter.fallback_item_selector)
+        self.skip_items_with = compile_optional(adapter.skip_items_with)
+        self.title_rules = [(soupsieve.compile(sel), attr) for sel, attr in adapter.title_rules]
+        self.image_rules = [(soupsieve.compile(sel), attr) for sel, attr in adapter.image_rules]
+
+class SiteAdapter:
+    """Extraction rules for one recipe site, plus hit-rate and timing counters."""
+
+    def __init__(self, name, domain, section_selectors, item_selector,
+                 fallback_item_selector=None, min_length=0, skip_items_with=None,
+                 deduplicate=False, title_rules=None, image_rules=None):
+        self.name = name
+        self.domain = domain
+        self.section_selectors = section_selectors # Tried in order, first match wins
+        self.item_selector = item_selector
+        self.fallback_item_selector = fallback_item_selector
+        self.min_length = min_length
+        self.skip_items_with = skip_items_with
+        self.deduplicate = deduplicate
+        # (selector, attribute) pairs; attribute None means the element text
+        self.title_rules = title_rules or OG_TITLE_RULES
+        self.image_rules = image_rules or OG_IMAGE_RULES
+        self._compiled = None
+        self._lock = threading.Lock()
+        self.attempts = 0
+        self.hits = 0
+        self.total_seconds = 0.0
+
+    @property
+    def compiled(self):
+        if self._compiled is None:
+            self._compiled = _CompiledRules(self) # A racing thread at worst compiles twice
+        return self._compiled
+
+    def extract_ingredients(self, soup, clean):
+        """Returns the cleaned ingredient lines for this site, or [] when the markup didn't match."""
+        started = time.perf_counter()
+        ingredients = []
+        rules = self.compiled
+        try:
+            section = None
+            for selector in rules.section_selectors:
+                section = selector.select_one(soup)
+                if section is not None:
+                    break
+            if section is not None:
+                items = rules.item_selector.select(section)
+                if not items and rules.fallback_item_selector:
+                    items = rules.fallback_item_selector.select(section)
+                for item in items:
+                    text = clean(item.get_text())
+                    if not text or len(text) <= self.min_length:
+                        continue
+                    if rules.skip_items_with and rules.skip_items_with.select_one(item) is not None:
+                        continue
+                    ingredients.append(text)
+                if self.deduplicate:
+                    ingredients = list(dict.fromkeys(ingredients))
+            return ingredients
+        finally:
+            self._record(bool(ingredients), time.perf_counter() - started)
+
+    def extract_title(self, soup):
+        return self._first_value(soup, self.compiled.title_rules)
+
+    def extract_image(self, soup):
+        return self._first_value(soup, self.compiled.image_rules)
+
+    def _first_value(self, soup, rules):
+        for selector, attribute in rules:
+            element = selector.select_one(soup)
+            if element is None:
+                continue
+            value = element.get(attribute) if attribute else element.get_text(strip=True)
+            if value:
+                return value
+        return None
+
+    def _record(self, hit, seconds):
+        with self._lock:
+            self.attempts += 1
+            self.hits += int(hit)
+            self.total_seconds += seconds
+
+    def stats(self):
+        with self._lock:
+            return {
+                "domain": self.domain,
+                "attempts": self.attempts,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.attempts, 3) if self.attempts else None,
+                "avg_ms": round(self.total_seconds * 1000 / self.attempts, 2) if self.attempts else None,
+            }
+
+OG_TITLE_RULES = [('meta[property="og:title"]', 'content'), ('title', None)]
+OG_IMAGE_RULES = [('meta[property="og:image"]', 'content')]
+
+# --- Registry ---
+
+ADAPTERS = {}
+
+def register(adapter):
+    ADAPTERS[adapter.domain] = adapter
+    return adapter
+
+def find_adapter(hostname):
+    """O(1) lookup of the adapter for a hostname, or None for sites without one."""
+    return ADAPTERS.get(registrable_domain(hostname))
+
+def adapter_stats():
+    return {adapter.name: adapter.stats() for adapter in ADAPTERS.values()}
+
+# --- Swedish Recipe Sites ---
+
+# ICA: <div class="ingredients"><ul><li>...</li></ul></div>, or <div class="recipe-ingredients-list">
+register(SiteAdapter(
+    name='ica', domain='ica.se',
+    section_selectors=['div.ingredients', 'div.recipe-ingredients-list'],
+    item_selector='li',
+    fallback_item_selector=':scope > div', # Some layouts use direct child divs instead of LIs
+))
+
+# Köket: a data-attribute-marked list, an ingredient-list UL, or any div with an ingredient class.
+# The item search is broad, so short fragments and section headers are filtered out.
+register(SiteAdapter(
+    name='koket', domain='koket.se',
+    section_selectors=['div[data-recipe-ingredient-list]', 'ul.ingredient-list', 'div[class*="ingredient" i]'],
+    item_selector='li, div, p',
+    min_length=3,
+    skip_items_with='h1, h2, h3, h4',
+    deduplicate=True,
+))
+
+# Arla: <div class="recipe-section__ingredients"> with <p> or <li> items
+register(SiteAdapter(
+    name='arla', domain='arla.se',
+    section_selectors=['div[class*="recipe"][class*="ingredients"]'],
+    item_selector='li, p',
+))
+
+# Coop: <div class="IngredientList-content"><ul class="List List--section"><li class="u-paddingHxsm ...">
+register(SiteAdapter(
+    name='coop', domain='coop.se',
+    section_selectors=['div.IngredientList-content'],
+    item_selector='li.u-paddingHxsm.u-textNormal.u-colorBase',
+))
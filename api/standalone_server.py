@@ -0,0 +1,229 @@
+"""Self-hosted server for the recipe endpoints, outside Vercel's wrapper.
+
+Serves /api/fetch_recipe_meta, /api/fetch_recipe_batch, /api/refresh_recipes,
+/api/aggregate_ingredients and /api/thumbnail with the same handler classes Vercel runs. A fixed pool of worker threads takes accepted connections from a
+bounded queue. When the queue is full, new connections are answered 503 with Retry-After right
+away instead of piling up behind a slow recipe site. Identical URLs in flight are coalesced by
+build_recipe_meta, so a burst of pastes of the same recipe costs one fetch.
+
+Usage:
+    python api/standalone_server.py --port 8000 --workers 16 --queue 64
+
+GET /healthz reports worker, queue and rejection counts.
+"""
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import argparse
+import json
+import os
+import queue
+import selectors
+import socket
+import sys
+import threading
+import time
+import urllib.parse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__))) # Let the server import its sibling modules
+import aggregate_ingredients
+import fetch_recipe_batch
+import fetch_recipe_meta
+import refresh_recipes
+import thumbnail
+from http_helpers import send_json
+from instrumentation import get_logger, metrics
+
+log = get_logger('standalone_server')
+
+# --- Server Settings ---
+
+DEFAULT_WORKERS = int(os.environ.get('RECIPE_SERVER_WORKERS', 16))
+DEFAULT_QUEUE_SIZE = int(os.environ.get('RECIPE_SERVER_QUEUE', 64))
+SOCKET_TIMEOUT = 30 # Seconds a client may take to send its request before the worker gives up
+RETRY_AFTER = 2 # Seconds suggested to rejected clients
+REJECT_DRAIN_SECONDS = 0.1 # Time spent reading a rejected request so closing doesn't reset the 503
+MAX_DRAINING = 1024 # Rejected sockets being drained at once; beyond this they are closed right away
+
+ROUTES = {
+    '/api/fetch_recipe_meta': fetch_recipe_meta.handler,
+    '/api/fetch_recipe_batch': fetch_recipe_batch.handler,
+    '/api/refresh_recipes': refresh_recipes.handler,
+    '/api/aggregate_ingredients': aggregate_ingredients.handler,
+    '/api/thumbnail': thumbnail.handler,
+}
+
+class RoutingHandler(BaseHTTPRequestHandler):
+    """Parses the request line, then hands the request to the endpoint's own handler class."""
+
+    timeout = SOCKET_TIMEOUT
+
+    def do_GET(self):
+        if urllib.parse.urlparse(self.path).path == '/healthz':
+            send_json(self, 200, self.server.stats())
+            return
+        self._delegate('do_GET')
+
+    def do_POST(self):
+        self._delegate('do_POST')
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.end_headers()
+
+    def _delegate(self, method):
+        endpoint = ROUTES.get(urllib.parse.urlparse(self.path).path)
+        if endpoint is None or not hasattr(endpoint, method):
+            send_json(self, 404, {'error': 'Not found'})
+            return
+        # The endpoint handler takes over this already-parsed request: same socket, headers and state
+        delegate = endpoint.__new__(endpoint)
+        delegate.__dict__.update(self.__dict__)
+        delegate.log_message = self.log_message
+        getattr(delegate, method)()
+        self.close_connection = delegate.close_connection
+
+    def log_message(self, format, *args):
+        log.debug('access', client=self.client_address[0], line=format % args)
+
+class RejectDrainer:
+    """Reads what rejected clients are still sending, then closes their sockets, all on one thread.
+
+    Closing with an unread request still buffered would send a reset that can reach the client
+    before the 503, so each socket is drained until EOF or REJECT_DRAIN_SECONDS. Doing that here
+    keeps the accept loop from waiting on slow or idle rejected clients.
+    """
+
+    def __init__(self):
+        self._incoming = queue.Queue()
+        self._selector = selectors.DefaultSelector()
+        self._close_at = {} # socket -> time.monotonic() deadline
+        threading.Thread(target=self._run, name='recipe-reject-drainer', daemon=True).start()
+
+    def add(self, request):
+        self._incoming.put(request)
+
+    def _run(self):
+        while True:
+            self._take_incoming(block=not self._close_at)
+            now = time.monotonic()
+            timeout = max(0, min(min(self._close_at.values()) - now, REJECT_DRAIN_SECONDS / 4))
+            for key, _ in self._selector.select(timeout):
+                try:
+                    if key.fileobj.recv(65536):
+                        continue
+                except OSError:
+                    pass
+                self._close(key.fileobj) # EOF or error: the client has finished or gone
+            now = time.monotonic()
+            for request in [request for request, close_at in self._close_at.items() if close_at <= now]:
+                self._close(request)
+
+    def _take_incoming(self, block):
+        while True:
+            try:
+                request = self._incoming.get(block=block)
+            except queue.Empty:
+                return
+            block = False
+            if len(self._close_at) >= MAX_DRAINING:
+                request.close()
+                continue
+            self._selector.register(request, selectors.EVENT_READ)
+            self._close_at[request] = time.monotonic() + REJECT_DRAIN_SECONDS
+
+    def _close(self, request):
+        self._selector.unregister(request)
+        del self._close_at[request]
+        request.close()
+
+class BoundedThreadPoolServer(HTTPServer):
+    """HTTPServer whose connections are handled by a fixed worker pool fed from a bounded queue."""
+
+    def __init__(self, server_address, handler_class, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE):
+        self.request_queue_size = queue_size # Listen backlog; the kernel queues beyond our own queue
+        super().__init__(server_address, handler_class)
+        self.workers = workers
+        self._pending = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._busy = 0
+        self.rejected = 0
+        self._drainer = RejectDrainer()
+        for index in range(workers):
+            threading.Thread(target=self._work, name=f'recipe-worker-{index}', daemon=True).start()
+
+    def process_request(self, request, client_address):
+        """Queues the connection for a worker, or rejects it at once when the queue is full."""
+        try:
+            self._pending.put_nowait((request, client_address))
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            metrics.increment('server_rejected', 'queue_full')
+            self._reject(request)
+
+    def _work(self):
+        while True:
+            request, client_address = self._pending.get()
+            with self._lock:
+                self._busy += 1
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+                with self._lock:
+                    self._busy -= 1
+
+    def _reject(self, request):
+        """Sends the 503 without blocking and leaves draining and closing to the RejectDrainer."""
+        body = json.dumps({'error': 'Server busy, retry shortly'}).encode('utf-8')
+        head = (f"HTTP/1.0 503 Service Unavailable\r\nContent-Type: application/json\r\n"
+                f"Access-Control-Allow-Origin: *\r\nRetry-After: {RETRY_AFTER}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n").encode('latin-1')
+        try:
+            request.setblocking(False)
+            request.send(head + body) # A new socket's send buffer always has room for this
+            request.shutdown(socket.SHUT_WR)
+        except OSError:
+            request.close() # The client already went away
+            return
+        self._drainer.add(request)
+
+    def handle_error(self, request, client_address):
+        log.error('request_failed', exc_info=True, client=client_address[0])
+
+    def stats(self):
+        with self._lock:
+            busy, rejected = self._busy, self.rejected
+        return {
+            "workers": self.workers,
+            "busy": busy,
+            "queued": self._pending.qsize(),
+            "queue_size": self._pending.maxsize,
+            "rejected": rejected,
+            "single_flight": fetch_recipe_meta.recipe_flights.stats(),
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the recipe endpoints without Vercel.')
+    parser.add_argument('--host', default=os.environ.get('HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 8000)))
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='requests handled at once')
+    parser.add_argument('--queue', type=int, default=DEFAULT_QUEUE_SIZE, help='accepted connections waiting for a worker')
+    args = parser.parse_args()
+
+    server = BoundedThreadPoolServer((args.host, args.port), RoutingHandler, args.workers, args.queue)
+    print(f"Serving recipe API on http://{args.host}:{args.port} "
+          f"({args.workers} workers, queue {args.queue})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+"""Thumbnail proxy for recipe images.
+
+GET /api/thumbnail?url=<image url>&size=small|medium|large returns the image scaled to fit a
+fixed box, as AVIF when the client accepts it and this Pillow build can encode it, else WebP.
+The source is fetched once, streamed to a spooled temporary file with a byte cap, and decoded
+with Pillow's draft mode, which lets JPEGs decode straight at 1/2 to 1/8 scale instead of at
+full resolution. Every size is rendered from that one decode and kept in the disk cache, so
+later requests for any size never reach the image's origin.
+
+Thumbnail URLs carry an HMAC of the image URL (`sig`) made with RECIPE_THUMBNAIL_SECRET, so the
+endpoint only fetches and redirects to images our own extraction returned; anything else gets a
+400. Without the secret, thumbnail_urls returns None and the app shows the original image.
+
+When the thumbnail can't be made (Pillow missing in a slim build, not an image, too large or
+unreadable) the endpoint redirects to the original image, so a recipe card still shows it.
+"""
+from http.server import BaseHTTPRequestHandler
+import hashlib
+import hmac
+import importlib.util
+import io
+import os
+import sys
+import tempfile
+import time
+import urllib.parse
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__))) # Let the function import its sibling modules
+from http_helpers import is_valid_url, send_json
+from http_pool import DeadlineWatchdog, session
+from instrumentation import RequestTrace, get_logger
+from recipe_cache import NegativeCache, normalize_url
+from single_flight import SingleFlight
+from thumbnail_cache import thumbnail_cache_from_environment
+
+log = get_logger('thumbnail')
+
+# --- Thumbnail Settings ---
+
+THUMBNAIL_SIZES = {'small': 128, 'medium': 320, 'large': 640} # Longest side in pixels
+DEFAULT_SIZE = 'small'
+FORMATS = {'avif': ('AVIF', 'image/avif', {'quality': 55}),
+           'webp': ('WEBP', 'image/webp', {'quality': 78, 'method': 4})}
+MAX_SOURCE_BYTES = 12 * 1024 * 1024
+MAX_SOURCE_PIXELS = 40_000_000 # Refused before decoding, against decompression bombs
+SPOOL_BYTES = 1024 * 1024 # Sources larger than this are buffered on disk, not in memory
+SOURCE_TIMEOUT = (3, 3) # Connect, read; both fit inside SOURCE_DEADLINE
+SOURCE_DEADLINE = 6 # Seconds for the whole download, leaving time to render under Vercel's 10 s limit
+CHUNK_SIZE = 64 * 1024
+FAILURE_TTL = 300 # Seconds a source that could not be thumbnailed is redirected without retrying
+CACHE_CONTROL = 'public, max-age=86400, s-maxage=604800, stale-while-revalidate=86400'
+PILLOW_AVAILABLE = importlib.util.find_spec('PIL') is not None # Not in the slim build
+SIGNING_SECRET = os.environ.get('RECIPE_THUMBNAIL_SECRET', '').encode('utf-8') # Shared by every function
+SIGNATURE_HEX_CHARS = 32
+
+thumbnail_cache = thumbnail_cache_from_environment()
+thumbnail_flights = SingleFlight()
+failed_sources = NegativeCache(FAILURE_TTL, 1024)
+
+class ThumbnailError(Exception):
+    """The source can't be thumbnailed; the client is sent to the original image instead."""
+
+def sign_image_url(image_url):
+    """HMAC-SHA256 of the image URL under SIGNING_SECRET, as truncated hex."""
+    return hmac.new(SIGNING_SECRET, image_url.encode('utf-8'), hashlib.sha256).hexdigest()[:SIGNATURE_HEX_CHARS]
+
+def has_valid_signature(image_url, signature):
+    return bool(SIGNING_SECRET and signature) and hmac.compare_digest(sign_image_url(image_url), signature)
+
+def thumbnail_urls(image_url):
+    """Relative signed thumbnail endpoint URL per size for a recipe image.
+
+    None without a usable image, or when no signing secret is configured.
+    """
+    if not SIGNING_SECRET or not image_url or urllib.parse.urlparse(image_url).scheme not in ('http', 'https'):
+        return None
+    quoted = urllib.parse.quote(image_url, safe='')
+    signature = sign_image_url(image_url)
+    return {size: f'/api/thumbnail?url={quoted}&size={size}&sig={signature}' for size in THUMBNAIL_SIZES}
+
+# --- Fetching and Rendering ---
+
+def encodable_formats():
+    """Formats in FORMATS that this Pillow build can write, best first."""
+    from PIL import Image
+    Image.init()
+    return [name for name, (pillow_format, _, _) in FORMATS.items() if pillow_format in Image.SAVE]
+
+def choose_format(requested, accept_header):
+    """?format= if given and encodable, else AVIF when accepted and encodable, else WebP."""
+    available = encodable_formats() if PILLOW_AVAILABLE else []
+    if requested in available:
+        return requested
+    if 'avif' in available and 'image/avif' in (accept_header or ''):
+        return 'avif'
+    return 'webp'
+
+def fetch_source(url):
+    """Downloads the image into a spooled temporary file. Returns (file, sha256 hex digest, bytes)."""
+    deadline = time.monotonic() + SOURCE_DEADLINE
+    with session.get(url, stream=True, timeout=SOURCE_TIMEOUT, headers={'Accept': 'image/*'}) as response:
+        response.raise_for_status()
+        if not response.headers.get('Content-Type', 'image/').startswith('image/'):
+            raise ThumbnailError(f"not an image: {response.headers.get('Content-Type')}")
+        if int(response.headers.get('Content-Length') or 0) > MAX_SOURCE_BYTES:
+            raise ThumbnailError('source image too large')
+        source = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with DeadlineWatchdog(response, deadline) as watchdog: # Cuts off a trickling server mid-chunk
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > MAX_SOURCE_BYTES or time.monotonic() > deadline:
+                        raise ThumbnailError('source image too large or too slow')
+                    digest.update(chunk)
+                    source.write(chunk)
+            if watchdog.fired:
+                raise ThumbnailError('source image too slow') # The body ended because the socket was shut down
+        except requests.exceptions.RequestException as e:
+            source.close()
+            if watchdog.fired:
+                raise ThumbnailError('source image too slow') from e
+            raise
+        except ThumbnailError:
+            source.close()
+            raise
+    source.seek(0)
+    return source, digest.hexdigest(), size
+
+def render_thumbnails(source, image_format):
+    """Decodes the source once and encodes every THUMBNAIL_SIZES entry. Returns {size: bytes}."""
+    from PIL import Image, ImageOps
+    pillow_format, _, options = FORMATS[image_format]
+    try:
+        with Image.open(source) as image:
+            if image.width * image.height > MAX_SOURCE_PIXELS:
+                raise ThumbnailError(f'source image has too many pixels: {image.width}x{image.height}')
+            largest = max(THUMBNAIL_SIZES.values())
+            image.draft('RGB', (largest, largest)) # JPEG only: decode at a reduced scale
+            image = ImageOps.exif_transpose(image)
+            has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+        raise ThumbnailError(f'unreadable image: {e}') from e
+
+    thumbnails = {}
+    # Largest first, each step scaling down the previous one
+    for size, box in sorted(THUMBNAIL_SIZES.items(), key=lambda item: item[1], reverse=True):
+        image.thumbnail((box, box), Image.Resampling.LANCZOS, reducing_gap=2.0)
+        buffer = io.BytesIO()
+        image.save(buffer, pillow_format, **options)
+        thumbnails[size] = buffer.getvalue()
+    return thumbnails
+
+def build_thumbnails(url, image_format, trace):
+    """Fetches and renders every size of one source and caches them. Returns (digest, {size: bytes})."""
+    source, digest, source_bytes = trace.time('fetch', fetch_source, url)
+    trace.annotate(bytes_fetched=source_bytes)
+    with source:
+        thumbnails = trace.time('render', render_thumbnails, source, image_format)
+    if thumbnail_cache:
+        try:
+            thumbnail_cache.store(url, digest, thumbnails, image_format)
+        except OSError as e:
+            log.warning('thumbnail_cache_store_failed', url=url, error=str(e))
+    return digest, thumbnails
+
+def get_thumbnail(url, size, image_format, trace):
+    """Returns (digest, bytes) of one thumbnail from the cache, or renders it. Raises ThumbnailError."""
+    if thumbnail_cache:
+        cached = thumbnail_cache.lookup(url, size, image_format)
+        if cached:
+            trace.annotate(cache='hit')
+            return cached
+    if not PILLOW_AVAILABLE:
+        raise ThumbnailError('Pillow is not installed')
+    if failed_sources.lookup(url):
+        trace.annotate(cache='negative')
+        raise ThumbnailError('recently failed')
+
+    trace.annotate(cache='miss')
+    try:
+        # Concurrent requests for the same source (often several sizes at once) share one render
+        (digest, thumbnails), shared = thumbnail_flights.do(
+            (normalize_url(url), image_format), build_thumbnails, url, image_format, trace)
+    except (ThumbnailError, requests.exceptions.RequestException) as e:
+        failed_sources.store(url, None, str(e))
+        raise ThumbnailError(str(e)) from e
+    if shared:
+        trace.annotate(coalesced=True)
+    return digest, thumbnails[size]
+
+# --- Main Handler Class ---
+
+class handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        url = query.get('url', [None])[0]
+        size = query.get('size', [DEFAULT_SIZE])[0]
+        if not url or not is_valid_url(url):
+            send_json(self, 400, {'error': 'Invalid or missing image URL'})
+            return
+        if not has_valid_signature(url, query.get('sig', [None])[0]):
+            # Unsigned URLs are neither fetched nor redirected to: this is not an open proxy or redirect
+            send_json(self, 400, {'error': 'Invalid or missing signature'})
+            return
+        if size not in THUMBNAIL_SIZES:
+            send_json(self, 400, {'error': f'size must be one of {", ".join(THUMBNAIL_SIZES)}'})
+            return
+
+        image_format = choose_format(query.get('format', [None])[0], self.headers.get('Accept'))
+        trace = RequestTrace(url, endpoint='thumbnail')
+        trace.annotate(format=image_format, size=size)
+        try:
+            digest, data = get_thumbnail(url, size, image_format, trace)
+        except ThumbnailError as e:
+            log.info('thumbnail_fallback', url=url, reason=str(e))
+            trace.finish(302)
+            self.send_response(302)
+            self.send_header('Location', url)
+            self.send_header('Cache-Control', f'public, max-age={FAILURE_TTL}')
+            self.end_headers()
+            return
+
+        etag = f'"{digest[:32]}-{size}-{image_format}"'
+        headers = {
+            'ETag': etag,
+            'Cache-Control': CACHE_CONTROL,
+            'Vary': 'Accept',
+            'Server-Timing': trace.server_timing(),
+            'Timing-Allow-Origin': '*',
+        }
+        if self.headers.get('If-None-Match') == etag:
+            trace.finish(304)
+            self._send_image(304, None, None, headers)
+            return
+        trace.finish(200)
+        self._send_image(200, data, FORMATS[image_format][1], headers)
+
+    def _send_image(self, status_code, data, content_type, headers):
+        self.send_response(status_code)
+        if content_type:
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if data:
+            self.wfile.write(data)
+
+# This setup allows Vercel to run the handler class.
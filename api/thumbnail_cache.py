@@ -0,0 +1,142 @@
+"""Content-addressed disk cache for recipe image thumbnails.
+
+A thumbnail is stored under the SHA-256 of the source image bytes plus its size and format, so
+the same photo served from several URLs (CDN variants, recipe reposts) is rendered and stored
+once. A small index file per source URL points at that digest. Files are evicted oldest-used
+first when the cache grows past its byte budget; reads refresh the mtime of the thumbnail and
+of its index file, which is the recency the eviction sorts by. Writes go through a temporary
+file and os.replace, so concurrent processes sharing the directory never see a half-written
+thumbnail.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+
+from recipe_cache import WRITABLE_DIR, normalize_url
+
+TEMP_SUFFIX = '.tmp'
+EVICT_TO_FRACTION = 0.8 # Evicting frees a margin, so the next few stores don't each trigger a scan
+
+class ThumbnailCache:
+    """Thumbnails on disk under `root`, at most `max_bytes` in total."""
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._bytes = None # Counted on the first store, not at import
+        self._counts = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    def _source_path(self, url):
+        key = hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()
+        return os.path.join(self.root, 'sources', key[:2], key)
+
+    def _blob_path(self, digest, size, image_format):
+        return os.path.join(self.root, 'blobs', digest[:2], f'{digest}-{size}.{image_format}')
+
+    def lookup(self, url, size, image_format):
+        """Returns (digest, thumbnail_bytes) for the source URL, or None."""
+        source_path = self._source_path(url)
+        try:
+            with open(source_path, encoding='ascii') as f:
+                digest = f.read().strip()
+            path = self._blob_path(digest, size, image_format)
+            with open(path, 'rb') as f:
+                data = f.read()
+            # Both, or eviction would drop the index of a popular image first and orphan its blobs
+            os.utime(path)
+            os.utime(source_path)
+        except OSError:
+            self._count('misses')
+            return None
+        self._count('hits')
+        return digest, data
+
+    def store(self, url, digest, thumbnails, image_format):
+        """Stores {size: bytes} rendered from the source with this digest, and points the URL at it."""
+        written = self._write(self._source_path(url), digest.encode('ascii'))
+        for size, data in thumbnails.items():
+            written += self._write(self._blob_path(digest, size, image_format), data)
+        self._count('stores')
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = self._disk_usage()
+            else:
+                self._bytes += written
+            over_budget = self._bytes > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def _write(self, path, data):
+        """Writes the file atomically. Returns how many bytes the cache grew by."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=TEMP_SUFFIX)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError:
+            os.unlink(temp_path)
+            raise
+        return len(data) - replaced
+
+    def _files(self):
+        """(mtime, size, path) of every cached file, without writes still in progress."""
+        files = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith(TEMP_SUFFIX):
+                    continue # Another writer's file until its os.replace
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue # Evicted by another process meanwhile
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _disk_usage(self):
+        return sum(size for _, size, _ in self._files())
+
+    def evict(self):
+        """Deletes the least recently used files until the cache is back under its budget."""
+        files = sorted(self._files())
+        total = sum(size for _, size, _ in files)
+        target = self.max_bytes * EVICT_TO_FRACTION
+        evicted = 0
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._bytes = total
+            self._counts['evictions'] += evicted
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+            counts['bytes'] = self._bytes
+        counts['max_bytes'] = self.max_bytes
+        return counts
+
+def thumbnail_cache_from_environment():
+    """Builds the cache configured by RECIPE_THUMBNAIL_* environment variables, or None if disabled."""
+    max_mb = float(os.environ.get('RECIPE_THUMBNAIL_CACHE_MB', 256))
+    if max_mb <= 0:
+        return None
+    root = os.environ.get('RECIPE_THUMBNAIL_CACHE_DIR', os.path.join(WRITABLE_DIR, 'recipe_thumbnails'))
+    return ThumbnailCache(root, int(max_mb * 1024 * 1024))
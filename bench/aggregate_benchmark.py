@@ -0,0 +1,82 @@
+"""Benchmark for the ingredient normalisation and aggregation in api/ingredient_normalizer.py.
+
+Builds one aggregation request of about `--lines` ingredient lines from the expected
+ingredients in bench/corpus/manifest.json: each synthetic recipe is a corpus recipe with its
+quantities scaled, so ingredients repeat across recipes the way a week's grocery list does.
+Every line also gets a per-recipe preparation note, which the parser drops from the name, so
+no two lines are the same string and the cold run parses each one instead of hitting the
+parse cache. Reports the median time with an empty parse cache (a cold instance) and with a
+warm one, and checks them against "aggregate" in bench/thresholds.json.
+
+Usage:
+    python bench/aggregate_benchmark.py
+    python bench/aggregate_benchmark.py --lines 5000 --repeat 20
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'api'))
+from ingredient_normalizer import aggregate_ingredients, parse_ingredient
+
+LEADING_NUMBER_RE = re.compile(r'^\d+')
+SCALES = (1, 2, 3, 4, 6) # Servings multipliers applied to the corpus recipes
+
+def corpus_recipes():
+    with open(os.path.join(BENCH_DIR, 'corpus', 'manifest.json'), encoding='utf-8') as f:
+        pages = json.load(f)['pages']
+    return [(page['url'], page['expected']['ingredients']) for page in pages if page['expected'].get('ingredients')]
+
+def build_request(line_target):
+    """(source, lines) pairs totalling at least line_target lines."""
+    base = corpus_recipes()
+    recipes, total = [], 0
+    while total < line_target:
+        url, lines = base[len(recipes) % len(base)]
+        scale = SCALES[len(recipes) // len(base) % len(SCALES)]
+        scaled = [LEADING_NUMBER_RE.sub(lambda m: str(int(m.group()) * scale), line) + f', batch {len(recipes)}'
+                  for line in lines]
+        recipes.append((f'{url}#{len(recipes)}', scaled))
+        total += len(scaled)
+    return recipes, total
+
+def timed_ms(func, *args):
+    started = time.perf_counter()
+    func(*args)
+    return (time.perf_counter() - started) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--lines', type=int, default=3000, help='ingredient lines in the request')
+    parser.add_argument('--repeat', type=int, default=10, help='runs per measurement; medians are reported')
+    parser.add_argument('--thresholds', default=os.path.join(BENCH_DIR, 'thresholds.json'))
+    args = parser.parse_args()
+
+    with open(args.thresholds, encoding='utf-8') as f:
+        limits = json.load(f)['aggregate']
+    recipes, total = build_request(args.lines)
+
+    cold, warm = [], []
+    for _ in range(args.repeat):
+        parse_ingredient.cache_clear()
+        cold.append(timed_ms(aggregate_ingredients, recipes))
+        warm.append(timed_ms(aggregate_ingredients, recipes))
+    items = aggregate_ingredients(recipes)
+    distinct = len({line for _, lines in recipes for line in lines})
+
+    cold_ms, warm_ms = round(statistics.median(cold), 2), round(statistics.median(warm), 2)
+    print(f"{len(recipes)} recipes, {total} lines ({distinct} distinct) -> {len(items)} grocery items")
+    print(f"  cold parse cache {cold_ms} ms, warm {warm_ms} ms")
+    failures = [f"{name} {ms} ms > {limits[key]} ms" for name, ms, key in
+                (('cold', cold_ms, 'max_cold_ms'), ('warm', warm_ms, 'max_warm_ms')) if ms > limits[key]]
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""Cold-start benchmark for the Python functions in api/.
+
+Each sample is a fresh interpreter, as on a cold serverless instance. It records the time to
+import each endpoint module, the resident memory after import, and which heavy libraries
+(bs4, lxml, soupsieve, requests, PIL) were loaded. It then warms fetch_recipe_meta with one JSON-LD
+page and one HTML-fallback page from bench/corpus, served by the same local stand-in as
+run_benchmarks.py, and records the resident memory of the warmed function.
+
+The full build (requirements.txt, lxml parser) is compared with the slim build
+(requirements-slim.txt, html.parser); the bundle size of each is summed from the installed
+distributions, uncompressed, so it is larger than the deployed zip. Limits live under
+"cold_start" in bench/thresholds.json. When lxml is installed locally, bs4 still imports it
+in the slim run, so that row measures the html.parser cost rather than lxml's absence.
+
+Usage:
+    python bench/cold_start.py                      # report and check thresholds
+    python bench/cold_start.py --repeat 10 --json cold_start.json
+"""
+import argparse
+import importlib.metadata
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.join(os.path.dirname(BENCH_DIR), 'api')
+ENDPOINTS = ('fetch_recipe_meta', 'fetch_recipe_batch', 'refresh_recipes', 'aggregate_ingredients', 'thumbnail')
+HEAVY_MODULES = ('requests', 'bs4', 'soupsieve', 'lxml', 'PIL')
+WARM_PAGES = ('jsonld', 'wprm') # One JSON-LD hit, then one page that needs the HTML fallback
+BUILDS = {
+    'full': {'requirements': 'requirements.txt', 'parser': 'lxml'},
+    'slim': {'requirements': 'requirements-slim.txt', 'parser': 'html.parser'},
+}
+
+# --- Child: one cold start ---
+
+def resident_mb():
+    """Current resident set size, from /proc where available, else the peak from getrusage."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def loaded_heavy_modules():
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+def run_child(endpoint, warm):
+    """Imports one endpoint in this fresh interpreter, optionally warms it, and prints a JSON report."""
+    import threading
+    import urllib.request
+    from http.server import ThreadingHTTPServer
+
+    report = {}
+    if warm:
+        # Start the replay proxy before the import so it isn't counted; it uses the stdlib only
+        sys.path.insert(0, BENCH_DIR)
+        from run_benchmarks import ReplayHandler, build_body, load_manifest
+        by_name = {page['name']: page for page in load_manifest()}
+        pages = [by_name[name] for name in WARM_PAGES] # In WARM_PAGES order: the JSON-LD page goes first
+        for page in pages:
+            page['body'] = build_body(page)
+        ReplayHandler.pages = {page['url']: page for page in pages}
+        proxy = ThreadingHTTPServer(('127.0.0.1', 0), ReplayHandler)
+        threading.Thread(target=proxy.serve_forever, daemon=True).start()
+        os.environ['HTTP_PROXY'] = os.environ['http_proxy'] = f"http://127.0.0.1:{proxy.server_address[1]}"
+        os.environ['NO_PROXY'] = os.environ['no_proxy'] = '127.0.0.1,localhost'
+    report['rss_before_mb'] = round(resident_mb(), 2)
+
+    sys.path.insert(0, API_DIR)
+    started = time.perf_counter()
+    module = __import__(endpoint)
+    report['import_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    report['rss_import_mb'] = round(resident_mb(), 2)
+    report['loaded_after_import'] = loaded_heavy_modules()
+
+    if warm:
+        class QuietHandler(module.handler):
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        direct = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+        api_url = f"http://127.0.0.1:{server.server_address[1]}"
+        report['first_request_ms'] = {}
+        for page in pages:
+            request = urllib.request.Request(api_url, data=json.dumps({'url': page['url']}).encode('utf-8'),
+                                             headers={'Content-Type': 'application/json'})
+            started = time.perf_counter()
+            with direct.open(request, timeout=30) as response:
+                response.read()
+            report['first_request_ms'][page['name']] = round((time.perf_counter() - started) * 1000, 2)
+            report[f"loaded_after_{page['name']}"] = loaded_heavy_modules()
+        report['rss_warm_mb'] = round(resident_mb(), 2)
+    print(json.dumps(report))
+
+# --- Parent: repeated samples per build ---
+
+def distribution_closure(requirement_names):
+    """Installed distributions needed by the requirement names, following non-extra dependencies."""
+    seen, pending = {}, list(requirement_names)
+    while pending:
+        name = re.split(r'[<>=!~;\[ ]', pending.pop(), maxsplit=1)[0].strip().lower().replace('_', '-')
+        if not name or name in seen:
+            continue
+        try:
+            dist = importlib.metadata.distribution(name)
+        except importlib.metadata.PackageNotFoundError:
+            seen[name] = None
+            continue
+        seen[name] = dist
+        pending += [req for req in dist.requires or [] if 'extra ==' not in req]
+    return seen
+
+def bundle_size_mb(requirements_path):
+    with open(requirements_path, encoding='utf-8') as f:
+        names = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    total = 0
+    for dist in distribution_closure(names).values():
+        for file in (dist.files or []) if dist else []:
+            path = file.locate()
+            if os.path.isfile(path):
+                total += os.path.getsize(path)
+    return round(total / (1024 * 1024), 2)
+
+def sample(endpoint, parser, warm):
+    env = {**os.environ, 'RECIPE_HTML_PARSER': parser, 'RECIPE_CACHE_BACKEND': 'none', 'RECIPE_TRACE_LOG': '0'}
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', endpoint] + (['--warm'] if warm else []),
+                            env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def median(values):
+    return round(statistics.median(values), 2)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per measurement; medians are reported')
+    parser.add_argument('--thresholds', default=os.path.join(BENCH_DIR, 'thresholds.json'))
+    parser.add_argument('--json', help='also write the results to this file')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--warm', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child(args.child, args.warm)
+        return
+
+    with open(args.thresholds, encoding='utf-8') as f:
+        limits = json.load(f)['cold_start']
+    results, failures = {}, []
+    for build, settings in BUILDS.items():
+        results[build] = {'bundle_mb': bundle_size_mb(os.path.join(API_DIR, settings['requirements'])), 'endpoints': {}}
+        for endpoint in ENDPOINTS:
+            samples = [sample(endpoint, settings['parser'], warm=False) for _ in range(args.repeat)]
+            results[build]['endpoints'][endpoint] = {
+                'import_ms': median([s['import_ms'] for s in samples]),
+                'rss_import_mb': median([s['rss_import_mb'] for s in samples]),
+                'loaded_after_import': samples[0]['loaded_after_import'],
+            }
+        warm = [sample('fetch_recipe_meta', settings['parser'], warm=True) for _ in range(args.repeat)]
+        results[build]['warm'] = {
+            'rss_warm_mb': median([s['rss_warm_mb'] for s in warm]),
+            'first_request_ms': {name: median([s['first_request_ms'][name] for s in warm]) for name in WARM_PAGES},
+            **{f'loaded_after_{name}': warm[0][f'loaded_after_{name}'] for name in WARM_PAGES},
+        }
+
+    for build, result in results.items():
+        print(f"{build} build: bundle {result['bundle_mb']} MB")
+        print(f"  {'endpoint':<22}{'import ms':>10}{'RSS MB':>9}  loaded at import")
+        for endpoint, row in result['endpoints'].items():
+            print(f"  {endpoint:<22}{row['import_ms']:>10}{row['rss_import_mb']:>9}  {', '.join(row['loaded_after_import']) or '-'}")
+            if row['import_ms'] > limits['max_import_ms']:
+                failures.append(f"{build}/{endpoint}: import {row['import_ms']} ms > {limits['max_import_ms']} ms")
+        warm = result['warm']
+        print(f"  warmed fetch_recipe_meta: RSS {warm['rss_warm_mb']} MB, first requests "
+              + ', '.join(f"{name} {ms} ms" for name, ms in warm['first_request_ms'].items()))
+        for name in WARM_PAGES:
+            print(f"    loaded after {name}: {', '.join(warm[f'loaded_after_{name}'])}")
+        if warm['rss_warm_mb'] > limits['max_warm_rss_mb']:
+            failures.append(f"{build}: warm RSS {warm['rss_warm_mb']} MB > {limits['max_warm_rss_mb']} MB")
+        if 'bs4' in warm[f'loaded_after_{WARM_PAGES[0]}']:
+            failures.append(f"{build}: bs4 was loaded to answer a JSON-LD page")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
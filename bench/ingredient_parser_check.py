@@ -0,0 +1,79 @@
+"""Table-driven check of the ingredient line parser in api/ingredient_normalizer.py.
+
+Each case is an ingredient line and the (quantity, unit, name) it should parse to, covering
+fractions, ranges, odd whitespace and the unit tables. The exit status is non-zero on any
+mismatch, so it can run next to bench/aggregate_benchmark.py.
+
+Usage:
+    python bench/ingredient_parser_check.py
+"""
+import os
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'api'))
+from ingredient_normalizer import aggregate_ingredients, parse_ingredient
+
+# line -> (quantity, unit, name)
+PARSE_CASES = [
+    # Fractions
+    ('½ tsk salt', (0.5, 'tsk', 'salt')),
+    ('1½ cups flour', (1.5, 'cup', 'flour')),
+    ('1 ½ dl mjölk', (1.5, 'dl', 'mjölk')),
+    ('1 1/2 cups flour', (1.5, 'cup', 'flour')),
+    ('3/4 cup sugar', (0.75, 'cup', 'sugar')),
+    ('2,5 dl grädde', (2.5, 'dl', 'grädde')),
+    ('1.5 kg potatis', (1.5, 'kg', 'potatis')),
+    # Whitespace other than a plain space
+    ('1\xa01/2 dl mjölk', (1.5, 'dl', 'mjölk')),
+    ('1\t1/2 dl mjölk', (1.5, 'dl', 'mjölk')),
+    ('2\xa0dl\xa0vatten', (2.0, 'dl', 'vatten')),
+    # Ranges keep the upper bound
+    ('2-3 msk olja', (3.0, 'msk', 'olja')),
+    ('2–3 msk olja', (3.0, 'msk', 'olja')),
+    ('2 to 3 tbsp butter', (3.0, 'tbsp', 'butter')),
+    # Units
+    ('ca 500 g nötfärs', (500.0, 'g', 'nötfärs')),
+    ('1 fl oz rum', (1.0, 'fl oz', 'rum')),
+    ('1 cup of sugar', (1.0, 'cup', 'sugar')),
+    ('2 cloves garlic, minced', (2.0, 'klyfta', 'garlic, minced')),
+    ('1 (400 g) burk krossade tomater', (1.0, 'burk', 'krossade tomater')),
+    ('1 nypa salt', (1.0, 'nypa', 'salt')),
+    # No unit, no quantity, or an unusable one
+    ('3 ägg', (3.0, None, 'ägg')),
+    ('2 stora morötter', (2.0, None, 'stora morötter')),
+    ('salt', (None, None, 'salt')),
+    ('pot roast', (None, None, 'pot roast')),
+    ('1/0 dl vatten', (None, None, '1/0 dl vatten')),
+]
+
+# (recipes, [(name, quantity, unit)])
+AGGREGATE_CASES = [
+    ([('a', ['2 dl mjölk']), ('b', ['1\xa01/2 dl mjölk'])], [('mjölk', 3.5, 'dl')]),
+    ([('a', ['1 msk smör']), ('b', ['50 g smör'])], [('smör', 1.0, 'msk'), ('smör', 50.0, 'g')]),
+    ([('a', ['1 l mjölk', '5 dl mjölk'])], [('mjölk', 1.5, 'l')]),
+    ([('a', ['salt']), ('b', ['salt'])], [('salt', None, None)]),
+]
+
+def main():
+    failures = []
+    for line, expected in PARSE_CASES:
+        try:
+            parsed = parse_ingredient(line)
+            actual = (parsed.quantity, parsed.unit, parsed.name)
+        except Exception as e:
+            actual = f'{type(e).__name__}: {e}'
+        if actual != expected:
+            failures.append(f'parse {line!r}: expected {expected}, got {actual}')
+    for recipes, expected in AGGREGATE_CASES:
+        actual = [(item['name'], item['quantity'], item['unit']) for item in aggregate_ingredients(recipes)]
+        if actual != expected:
+            failures.append(f'aggregate {recipes!r}: expected {expected}, got {actual}')
+
+    print(f"{len(PARSE_CASES)} parse cases, {len(AGGREGATE_CASES)} aggregate cases")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+"""Offline benchmark and regression suite for api/fetch_recipe_meta.py.
+
+The pages in bench/corpus are synthetic: small hand-written fixtures, not snapshots of the real
+sites. Each one reproduces the markup our extraction relies on for one site or strategy (the ICA,
+Köket, Arla and Coop adapter selectors, WPRM/Tasty/Mediavine recipe cards, JSON-LD with and
+without @graph, a plain heading blog), so the suite exercises every code path but won't notice
+when a real site changes its markup. They are replayed by a local stand-in for the recipe sites:
+an HTTP forward proxy that answers for www.ica.se, www.koket.se, ... with the page padded by
+filler markup to a realistic size, a configurable time to first byte and throttled chunks, and
+(per page) no charset in the Content-Type header. The real `handler` class is served on a local port and
+driven end to end, so the numbers include the fetch, JSON-LD, fallback and meta stages
+exactly as production runs them.
+
+Each page is checked for extraction correctness against bench/corpus/manifest.json, and the
+median per-stage wall time and peak Python memory are compared with bench/thresholds.json
+and, optionally, a saved baseline. The exit status is non-zero on any failure. The absolute
+thresholds are coarse guards that hold on a slow single-core machine; small regressions are
+caught by comparing against a baseline recorded on the same machine. Note that the fallback
+stage includes building the soup, which is also reported on its own as parse.
+
+Usage:
+    python bench/run_benchmarks.py                       # check correctness and thresholds
+    python bench/run_benchmarks.py --save-baseline       # record bench/baseline.json
+    python bench/run_benchmarks.py --baseline bench/baseline.json --max-regression-pct 20
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_DIR = os.path.join(BENCH_DIR, 'corpus')
+API_DIR = os.path.join(os.path.dirname(BENCH_DIR), 'api')
+STAGES = ('fetch', 'json_ld', 'fallback', 'meta', 'parse')
+REPLAY_CHUNK_SIZE = 64 * 1024
+PADDING_BLOCK = '<div class="ad-slot"><!-- sponsored content --><p>Annons</p></div>\n<!-- comment thread -->\n'
+
+# --- Local Stand-in for the Recipe Sites ---
+
+def load_manifest():
+    with open(os.path.join(CORPUS_DIR, 'manifest.json'), encoding='utf-8') as f:
+        return json.load(f)['pages']
+
+def build_body(page):
+    """The fixture page, padded with ad/comment filler after the recipe up to pad_to_bytes."""
+    with open(os.path.join(CORPUS_DIR, page['file']), 'rb') as f:
+        body = f.read()
+    missing = page.get('pad_to_bytes', 0) - len(body)
+    if missing > 0:
+        filler = (PADDING_BLOCK * (missing // len(PADDING_BLOCK) + 1)).encode('utf-8')[:missing]
+        split_at = body.rfind(b'</body>')
+        split_at = split_at if split_at != -1 else len(body)
+        body = body[:split_at] + filler + body[split_at:]
+    return body
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """Forward proxy that serves corpus pages for their original absolute URLs."""
+
+    pages = {}
+
+    def do_GET(self):
+        page = self.pages.get(self.path.split('?')[0].split('#')[0])
+        if page is None:
+            self.send_error(404)
+            return
+        time.sleep(page.get('latency_ms', 0) / 1000) # Time to first byte
+        body = page['body']
+        self.send_response(200)
+        self.send_header('Content-Type', page.get('content_type', 'text/html'))
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        chunk_delay = page.get('chunk_delay_ms', 0) / 1000
+        try:
+            for start in range(0, len(body), REPLAY_CHUNK_SIZE):
+                self.wfile.write(body[start:start + REPLAY_CHUNK_SIZE])
+                if chunk_delay:
+                    time.sleep(chunk_delay)
+        except (BrokenPipeError, ConnectionResetError):
+            pass # The fetcher stopped early once it had the recipe
+
+    def log_message(self, format, *args):
+        pass
+
+def start_server(handler_class):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler_class)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+# --- Running the Suite ---
+
+def median(values):
+    return round(statistics.median(values), 2) if values else None
+
+def run_page(client, api_url, page, repeat):
+    """Times `repeat` requests, then measures peak memory on one extra traced request."""
+    samples = {stage: [] for stage in STAGES}
+    totals, failures = [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.post(api_url, json={'url': page['url']}, timeout=30)
+        totals.append((time.perf_counter() - started) * 1000)
+        result = response.json()
+        for stage, value in result.get('timings', {}).items():
+            if stage in samples:
+                samples[stage].append(value)
+        failures += [f for f in check_result(page, response.status_code, result) if f not in failures]
+
+    # tracemalloc slows allocation-heavy parsing several times over, so it stays out of the timings
+    tracemalloc.start()
+    client.post(api_url, json={'url': page['url']}, timeout=30)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'total_ms': median(totals),
+        'stages_ms': {stage: median(values) for stage, values in samples.items() if values},
+        'peak_memory_mb': round(peak / (1024 * 1024), 2),
+        'bytes_served': len(page['body']),
+        'failures': failures,
+    }
+
+def check_result(page, status_code, result):
+    """Returns a list of correctness failures for one response."""
+    expected = page['expected']
+    failures = []
+    if status_code != 200:
+        failures.append(f"status {status_code}: {result.get('error')}")
+    for field in ('title', 'imageUrl', 'ingredients'):
+        if result.get(field) != expected.get(field):
+            failures.append(f"{field}: expected {expected.get(field)!r}, got {result.get(field)!r}")
+    return failures
+
+def check_thresholds(name, measured, thresholds, baseline):
+    failures = []
+    if measured['total_ms'] > thresholds['max_total_ms']:
+        failures.append(f"total {measured['total_ms']} ms > {thresholds['max_total_ms']} ms")
+    for stage, limit in thresholds['max_stage_ms'].items():
+        value = measured['stages_ms'].get(stage)
+        if value is not None and value > limit:
+            failures.append(f"{stage} {value} ms > {limit} ms")
+    if measured['peak_memory_mb'] > thresholds['max_peak_memory_mb']:
+        failures.append(f"peak memory {measured['peak_memory_mb']} MB > {thresholds['max_peak_memory_mb']} MB")
+
+    previous = (baseline or {}).get(name)
+    if previous:
+        allowed = 1 + thresholds['max_regression_pct'] / 100
+        pairs = [('total', measured['total_ms'], previous['total_ms'])]
+        pairs += [(stage, value, previous['stages_ms'].get(stage)) for stage, value in measured['stages_ms'].items()]
+        for label, value, before in pairs:
+            if before is None:
+                continue
+            if value > before * allowed and value - before > thresholds['min_regression_ms']:
+                failures.append(f"{label} regressed {before} -> {value} ms")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--repeat', type=int, default=5, help='requests per page; medians are reported')
+    parser.add_argument('--thresholds', default=os.path.join(BENCH_DIR, 'thresholds.json'))
+    parser.add_argument('--baseline', help='results JSON from an earlier run to compare against')
+    parser.add_argument('--save-baseline', nargs='?', const=os.path.join(BENCH_DIR, 'baseline.json'),
+                        help='write this run as the new baseline')
+    parser.add_argument('--max-regression-pct', type=float, help='override the threshold file')
+    parser.add_argument('--pages', nargs='*', help='only run these corpus page names')
+    parser.add_argument('--verbose', action='store_true', help="show the handler's per-request trace lines")
+    args = parser.parse_args()
+
+    with open(args.thresholds, encoding='utf-8') as f:
+        thresholds = json.load(f)
+    if args.max_regression_pct is not None:
+        thresholds['max_regression_pct'] = args.max_regression_pct
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    pages = [p for p in load_manifest() if not args.pages or p['name'] in args.pages]
+    for page in pages:
+        page['body'] = build_body(page)
+    ReplayHandler.pages = {page['url']: page for page in pages}
+
+    # Route the handler's outbound fetches through the replay proxy; no cache so every run fetches
+    _, proxy_url = start_server(ReplayHandler)
+    for key in ('HTTP_PROXY', 'http_proxy'):
+        os.environ[key] = proxy_url
+    for key in ('NO_PROXY', 'no_proxy'):
+        os.environ[key] = '127.0.0.1,localhost'
+    os.environ['RECIPE_CACHE_BACKEND'] = 'none'
+    if not args.verbose:
+        os.environ['RECIPE_TRACE_LOG'] = '0' # Keep the per-request trace lines out of the report
+    sys.path.insert(0, API_DIR)
+    import requests
+    import fetch_recipe_meta
+
+    class QuietHandler(fetch_recipe_meta.handler):
+        def log_message(self, format, *args):
+            pass # Only silences the per-request access log line
+
+    _, api_url = start_server(fetch_recipe_meta.handler if args.verbose else QuietHandler)
+    client = requests.Session()
+    client.trust_env = False # The benchmark client talks to the handler directly
+
+    results, failed = {}, False
+    print(f"{'page':<16}{'total':>9}{'fetch':>9}{'json_ld':>9}{'fallback':>10}{'meta':>8}{'parse':>8}{'peak MB':>9}  result")
+    for page in pages:
+        measured = run_page(client, api_url, page, args.repeat)
+        measured['failures'] += check_thresholds(page['name'], measured, thresholds, baseline)
+        results[page['name']] = measured
+        stages = measured['stages_ms']
+        cells = ''.join(f"{stages.get(stage, '-'):>{width}}" for stage, width in
+                        (('fetch', 9), ('json_ld', 9), ('fallback', 10), ('meta', 8), ('parse', 8)))
+        status = 'ok' if not measured['failures'] else 'FAIL'
+        print(f"{page['name']:<16}{measured['total_ms']:>9}{cells}{measured['peak_memory_mb']:>9}  {status}")
+        for failure in measured['failures']:
+            print(f"    - {failure}")
+        failed = failed or bool(measured['failures'])
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({name: {k: v for k, v in r.items() if k != 'failures'} for name, r in results.items()}, f, indent=2)
+        print(f"Baseline written to {args.save_baseline}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
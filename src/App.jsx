@@ -33,6 +33,7 @@ function App() {
       ...r, 
       title: r.title || r.url, 
       imageUrl: r.imageUrl || null,
+      thumbnails: r.thumbnails || null, // Resized copies served by /api/thumbnail
       ingredients: r.ingredients || [] // Add ingredients field
     })) : [];
   });
@@ -69,7 +70,9 @@ function App() {
     console.log(`Fetching metadata for: ${trimmedUrl}`); 
     let title = trimmedUrl; 
     let imageUrl = null; 
+    let thumbnails = null;
     let ingredients = [];
+    let sourceVersion = {}; // Validators used later to refresh the recipe cheaply
     let fetchSuccess = false; // Flag to track success
 
     try {
@@ -91,7 +94,9 @@ function App() {
         // Decode the title before assigning
         title = decodeHtmlEntities(data.title || trimmedUrl);
         imageUrl = data.imageUrl; 
+        thumbnails = data.thumbnails || null;
         ingredients = data.ingredients || []; 
+        sourceVersion = { etag: data.etag || null, lastModified: data.lastModified || null, contentHash: data.contentHash || null };
         fetchSuccess = true; // Mark as successful fetch
       }
     } catch (error) {
@@ -107,7 +112,9 @@ function App() {
         // Use the decoded title
         title: title, 
         imageUrl: imageUrl,
-        ingredients: ingredients
+        thumbnails: thumbnails,
+        ingredients: ingredients,
+        ...sourceVersion
       };
       
       // Use functional update form for setRecipes
@@ -131,6 +138,51 @@ function App() {
   // No need for separate recipe loading effect now, handled in useState initial value
   // useEffect(() => { ... }, [])
 
+  // Refresh saved recipes in the background on app start; only recipes whose source changed come back
+  useEffect(() => {
+    if (recipes.length === 0) return
+    const refresh = (saved) => fetch('/api/refresh_recipes', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ recipes: saved }),
+    })
+      .then(response => response.ok ? response.json() : null)
+      .then(data => {
+        if (!data) return
+        const changedByUrl = new Map(data.changed.map(delta => [delta.url, delta]))
+        // Unchanged recipes whose validators moved, so the next refresh can be answered with a 304
+        const revalidatedByUrl = new Map((data.revalidated || []).map(delta => [delta.url, delta]))
+        if (changedByUrl.size > 0 || revalidatedByUrl.size > 0) {
+          setRecipes(prevRecipes => prevRecipes.map(recipe => {
+            const revalidated = revalidatedByUrl.get(recipe.url)
+            if (revalidated) {
+              return { ...recipe, etag: revalidated.etag, lastModified: revalidated.lastModified }
+            }
+            const delta = changedByUrl.get(recipe.url)
+            if (!delta) return recipe
+            return {
+              ...recipe,
+              title: decodeHtmlEntities(delta.title || recipe.title),
+              imageUrl: delta.imageUrl || recipe.imageUrl,
+              thumbnails: delta.imageUrl ? delta.thumbnails : recipe.thumbnails,
+              ingredients: delta.ingredients.length > 0 ? delta.ingredients : recipe.ingredients,
+              etag: delta.etag,
+              lastModified: delta.lastModified,
+              contentHash: delta.contentHash
+            }
+          }))
+        }
+        // The server stops at its time budget; send what it didn't get to, as long as each round makes progress
+        const pending = new Set(data.pending || [])
+        if (pending.size > 0 && pending.size < saved.length) {
+          return refresh(saved.filter(recipe => pending.has(recipe.url)))
+        }
+      })
+    const saved = recipes.map(({ url, etag, lastModified, contentHash }) => ({ url, etag, lastModified, contentHash }))
+    refresh(saved).catch(error => console.error('Background recipe refresh failed:', error))
+  // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, []) // Run once on app start with the recipes loaded from localStorage
+
   // Save recipes to localStorage
   useEffect(() => {
     localStorage.setItem(LOCAL_STORAGE_KEY_RECIPES, JSON.stringify(recipes))
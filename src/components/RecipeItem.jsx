@@ -46,11 +46,22 @@ function RecipeItem({ recipe, onRequestDeleteRecipe, onAddIngredients, onShowPar
           <ListItemAvatar sx={{ mr: 1 /* Keep small margin right */ }}>
             <Avatar 
               variant="rounded" // Square corners
-              src={recipe.imageUrl} 
+              // 128px resized copy when the API provided one: sharp at 56px on 2x screens, a few KB instead of MBs
+              src={recipe.thumbnails ? recipe.thumbnails.small : recipe.imageUrl} 
               alt={`Thumbnail for ${recipe.title}`}
               sx={{ width: 56, height: 56 }}
-              // onError prop could be added if needed
-            />
+            >
+              {/* Avatar shows its children when src fails to load: a saved thumbnail URL is rejected
+                  once its signing secret is rotated or unset, so fall back to the original image */}
+              {recipe.thumbnails && (
+                <Avatar
+                  variant="rounded"
+                  src={recipe.imageUrl}
+                  alt={`Thumbnail for ${recipe.title}`}
+                  sx={{ width: '100%', height: '100%' }}
+                />
+              )}
+            </Avatar>
           </ListItemAvatar>
         )}
         {/* Main Text Content */}